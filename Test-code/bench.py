@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for MoodAnimator, TiltEmotions and NumberPad on a fake SenseHat.
+
+Runs without a board or the emulator (see fakeSense.py) and prints one JSON
+document so results can be diffed between commits:
+
+- build:   per-frame build time (us) and memory blocks per frame for every
+           AnimatedEmoji and every build_frames kind
+- render:  frames per second through each app's render path, and the
+           set_pixels / set_pixel calls it caused
+- latency: event-to-pixel latency (ms) for a joystick press or a tilt
+- pack:    emoji pack size, time to open it and to decode every animation
+- timing:  achieved fps, dropped frames and jitter of the animation loops
+- input:   MoodAnimator's input queue under stick mashing
+- simulate: virtual seconds per real second of each app on a VirtualClock
+            (clocks.py), with the idle-to-sleep, flash and flip counts seen
+
+Usage:
+    python3 bench.py [--quick] [--out results.json]
+"""
+
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import fakeSense
+fakeSense.install()
+
+import moodAnimator
+import tiltEmotions
+import calculator
+import emojiPack
+from clocks import VirtualClock
+
+EMOJIS = [moodAnimator.HappyEmoji, moodAnimator.SadEmoji, moodAnimator.AngryEmoji,
+          moodAnimator.SurprisedEmoji, moodAnimator.CoolEmoji, moodAnimator.LoveEmoji,
+          moodAnimator.SleepFace]
+KINDS = ["forward", "back", "left", "right", "flat", "special"]
+
+def time_build(build, repeat):
+    """Seconds per call of build(), and memory blocks held by one result."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        frames = build()
+    per_call = (time.perf_counter() - t0) / repeat
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    frames = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(s.count_diff for s in after.compare_to(before, "filename"))
+    return per_call, len(frames), blocks
+
+def bench_build(repeat):
+    out = {}
+    for cls in EMOJIS:
+        per_call, n, blocks = time_build(lambda: cls().frames(), repeat)
+        out["emoji." + cls.name] = {"frames": n, "us_per_frame": per_call / n * 1e6,
+                                    "blocks_per_frame": blocks / n}
+    for kind in KINDS:
+        per_call, n, blocks = time_build(lambda: tiltEmotions.build_frames(kind), repeat)
+        out["tilt." + kind] = {"frames": n, "us_per_frame": per_call / n * 1e6,
+                               "blocks_per_frame": blocks / n}
+    return out
+
+def bench_pack(repeat):
+    fd, path = tempfile.mkstemp(suffix=".pack")
+    os.close(fd)
+    try:
+        anims, frames = emojiPack.build(path)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            emojiPack.EmojiPack(path).close()
+        open_s = (time.perf_counter() - t0) / repeat
+        # frames are cached per pack: decode each time in a freshly opened
+        # one, timing only the decode
+        decode_s = 0.0
+        for _ in range(repeat):
+            pack = emojiPack.EmojiPack(path)
+            t0 = time.perf_counter()
+            for name in pack.names():
+                pack.frames(name)
+            decode_s += time.perf_counter() - t0
+            pack.close()
+        return {"animations": anims, "frames": frames, "bytes": os.path.getsize(path),
+                "open_us": open_s * 1e6, "decode_all_us": decode_s / repeat * 1e6}
+    finally:
+        os.unlink(path)
+
+def render_result(sense, frames, elapsed):
+    return {"frames": frames, "fps": frames / elapsed,
+            "set_pixels_calls": sense.set_pixels_calls,
+            "set_pixel_calls": sense.set_pixel_calls}
+
+def bench_render(n):
+    out = {}
+    # MoodAnimator: cached frame lookup + display commit, cycling emojis
+    app = moodAnimator.MoodAnimator()
+    app.sense.set_pixels_calls = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        emo = app.emojis[(i // 8) % len(app.emojis)]
+        frames = app.cache.frames(emo)
+        app.display.show(frames[i % len(frames)])
+    out["mood"] = render_result(app.sense, n, time.perf_counter() - t0)
+
+    # TiltEmotions: build a zone's sequence and show it
+    app = tiltEmotions.TiltEmotions()
+    app.sense.set_pixels_calls = 0
+    shown = 0
+    t0 = time.perf_counter()
+    for i in range(n // 3):
+        for f in tiltEmotions.build_frames(KINDS[i % len(KINDS)]):
+            app.display.show(f)
+            shown += 1
+    out["tilt"] = render_result(app.sense, shown, time.perf_counter() - t0)
+
+    # NumberPad: redraw after every value change
+    app = calculator.NumberPad()
+    app.sense.set_pixels_calls = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        app.x = float(i % 1200 - 200) / (1 if i % 2 else 10)
+        app._show_value()
+    out["pad"] = render_result(app.sense, n, time.perf_counter() - t0)
+    return out
+
+class WriteProbe:
+    """Timestamps the first display write after arm()."""
+
+    def __init__(self, sense):
+        self.hit = threading.Event()
+        self.ts = None
+        sense.on_write = self._on_write
+
+    def arm(self):
+        self.hit.clear()
+        self.ts = None
+        return time.perf_counter()
+
+    def _on_write(self):
+        if self.ts is None:
+            self.ts = time.perf_counter()
+            self.hit.set()
+
+    def wait(self, timeout=1.0):
+        return self.ts if self.hit.wait(timeout) else None
+
+def summarize(samples):
+    ms = sorted(s * 1e3 for s in samples)
+    if not ms:
+        return {"samples": 0}
+    return {"samples": len(ms), "median_ms": statistics.median(ms),
+            "p95_ms": ms[int(0.95 * (len(ms) - 1))], "max_ms": ms[-1]}
+
+def bench_latency(presses):
+    out = {}
+    # MoodAnimator: press left/right while the worker animates
+    app = moodAnimator.MoodAnimator()
+    app._register_joystick()
+    app.worker.start()
+    probe = WriteProbe(app.sense)
+    samples = []
+    for i in range(presses):
+        time.sleep(0.03)
+        t0 = probe.arm()
+        app.sense.stick.press("right" if i % 2 else "left")
+        ts = probe.wait()
+        if ts is not None:
+            samples.append(ts - t0)
+    app.shutdown()
+    out["mood.press"] = summarize(samples)
+
+    # NumberPad: time from press to the first (flash) frame
+    app = calculator.NumberPad()
+    app._bind_joystick()
+    app.start_display()
+    probe = WriteProbe(app.sense)
+    samples = []
+    for i in range(presses):
+        time.sleep(0.03)
+        t0 = probe.arm()
+        app.sense.stick.press("up" if i % 2 else "down")
+        ts = probe.wait()
+        if ts is not None:
+            samples.append(ts - t0)
+    app.stop_display()
+    out["pad.press"] = summarize(samples)
+
+    # TiltEmotions: time from a new orientation to its animation's first frame
+    app = tiltEmotions.TiltEmotions()
+    runner = threading.Thread(target=app.run, daemon=True)
+    runner.start()
+    probe = WriteProbe(app.sense)
+    samples = []
+    for i in range(presses):
+        time.sleep(0.1)
+        t0 = probe.arm()
+        app.sense.set_orientation(*((0.0, 0.0) if i % 2 else (40.0, 0.0)))
+        ts = probe.wait()
+        if ts is not None:
+            samples.append(ts - t0)
+    app.stop()
+    runner.join()   # run() also stops its IMU sampler and player
+    out["tilt.zone"] = summarize(samples)
+    return out
+
+def bench_input(presses):
+    """Mash the stick far faster than anyone can while MoodAnimator animates."""
+    app = moodAnimator.MoodAnimator()
+    app._register_joystick()
+    app.worker.start()
+    writes = app.sense.set_pixels_calls + app.sense.set_pixel_calls
+    t0 = time.perf_counter()
+    for i in range(presses):
+        app.sense.stick.press(("left", "right", "right", "middle", "middle")[i % 5])
+        time.sleep(0.0005)
+    elapsed = time.perf_counter() - t0
+    time.sleep(0.1)
+    app.shutdown()
+    out = app.input.stats()
+    out["presses_per_second"] = presses / elapsed if elapsed else 0.0
+    out["display_writes"] = app.sense.set_pixels_calls + app.sense.set_pixel_calls - writes
+    return out
+
+def bench_timing(seconds):
+    out = {}
+    app = moodAnimator.MoodAnimator()
+    app._register_joystick()
+    app.worker.start()
+    time.sleep(seconds)
+    app.shutdown()
+    out["mood"] = app.timing.stats()
+
+    app = tiltEmotions.TiltEmotions()
+    frames = tiltEmotions.build_frames("special")
+    app.show_sequence(frames * max(1, int(seconds * 12 / len(frames))), 12)
+    out["tilt"] = app.player.timing.stats()
+    return out
+
+def bench_simulate(seconds):
+    """Run each app's threaded loop for seconds of virtual time."""
+    out = {}
+    clock = VirtualClock()
+    sense = fakeSense.FakeSenseHat()
+    app = moodAnimator.MoodAnimator(sense=sense, clock=clock)
+    app._register_joystick()
+    app.worker.start()
+    t0 = time.perf_counter()
+    naps = 0
+    while clock.now < seconds:
+        sense.stick.press("right")
+        clock.sleep(app.IDLE_TIMEOUT + 10.0)   # long enough to fall asleep
+        naps += app.sleeping
+    app.shutdown()
+    elapsed = time.perf_counter() - t0
+    out["mood"] = {"virtual_per_real": clock.now / elapsed, "naps": naps,
+                   "frames": app.timing.shown}
+
+    clock = VirtualClock()
+    sense = fakeSense.FakeSenseHat()
+    pad = calculator.NumberPad(sense=sense, clock=clock)
+    pad._bind_joystick()
+    pad.start_display()
+    t0 = time.perf_counter()
+    while clock.now < seconds:
+        sense.stick.press("up")
+        clock.sleep(1.0)
+    pad.stop_display()
+    elapsed = time.perf_counter() - t0
+    out["pad"] = {"virtual_per_real": clock.now / elapsed, "flashes": pad.flashes}
+
+    clock = VirtualClock()
+    sense = fakeSense.FakeSenseHat()
+    hz = tiltEmotions.ImuSampler.RATE
+    cycle = ([(0.0, 0.0, 0.0)] * hz + [(40.0, 0.0, 0.0)] * hz +
+             [(0.0, j * 30.0 % 360, 0.0) for j in range(6)])   # flat, forward, flip
+    sense.script_orientation(cycle * int(seconds * hz / len(cycle) + 1))
+    app = tiltEmotions.TiltEmotions(sense=sense, clock=clock)
+    runner = clock.thread(app.run)
+    t0 = time.perf_counter()
+    runner.start()
+    clock.sleep(seconds)
+    app.stop()
+    runner.join()
+    elapsed = time.perf_counter() - t0
+    out["tilt"] = {"virtual_per_real": clock.now / elapsed, "samples": app.imu.count,
+                   "flips": app.gestures.counts["flip"], "played": app.player.played}
+    return out
+
+def run(quick=False):
+    return {
+        "build": bench_build(20 if quick else 200),
+        "render": bench_render(300 if quick else 3000),
+        "latency": bench_latency(5 if quick else 20),
+        "pack": bench_pack(20 if quick else 200),
+        "timing": bench_timing(1.0 if quick else 5.0),
+        "input": bench_input(500 if quick else 5000),
+        "simulate": bench_simulate(600.0 if quick else 3600.0),
+    }
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--quick", action="store_true", help="fewer iterations")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+    doc = json.dumps(run(args.quick), indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(doc + "\n")
+    else:
+        print(doc)
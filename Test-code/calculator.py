@@ -17,8 +17,15 @@ Flashes operation or error indicators briefly after each action.
 Author: <Your Name>, <Your Student ID>
 """
 
+import asyncio
 from math import sqrt, isfinite
-import time
+from functools import lru_cache
+
+from ledFrame import Frame, WIDTH, HEIGHT, ROW
+from displaySink import open_display, add_display_args
+import latency
+import frameRecord
+from clocks import SYSTEM
 
 # Try Sense HAT; fall back to sense_emu for off-device testing
 try:
@@ -112,6 +119,25 @@ FONT = {
           "100",
           "100"],
 }
+
+def compile_glyph(rows):
+    """Pack a 3x5 glyph into a 15-bit mask: bit (y*3 + x) is set when lit."""
+    bits = 0
+    for y, row in enumerate(rows):
+        for x, c in enumerate(row):
+            if c == "1":
+                bits |= 1 << (y*3 + x)
+    return bits
+
+# Compiled once at import: packed masks, and the lit (dx, dy) offsets of each
+GLYPHS = {ch: compile_glyph(rows) for ch, rows in FONT.items()}
+GLYPH_PIXELS = {ch: tuple((i % 3, i // 3) for i in range(15) if bits >> i & 1)
+                for ch, bits in GLYPHS.items()}
+
+RENDER_CACHE_SIZE = 64  # rendered frames kept by render_text_3x5
+SCROLL_FPS = 10         # columns per second when a value scrolls
+SCROLL_GAP = 3          # blank columns between repeats of a scrolling value
+
 # Colors
 BLACK = [0, 0, 0]
 FG = [255, 220, 0]     # default value color
@@ -119,27 +145,34 @@ OP = [0, 180, 255]     # operation flash color
 ERR = [255, 40, 40]    # error flash color
 
 def clear_buf(color=BLACK):
-    return [color[:] for _ in range(64)]
+    return Frame(color)
 
 def put(pixels, x, y, color):
-    if 0 <= x < 8 and 0 <= y < 8:
-        pixels[y*8 + x] = color[:]
+    pixels.put(x, y, color)
 
 def blit_glyph(pixels, glyph, x0, y0, color):
-    rows = FONT.get(glyph)
-    if not rows:
-        return
-    for y in range(5):
-        for x in range(3):
-            if rows[y][x] == "1":
-                put(pixels, x0 + x, y0 + y, color)
+    for x, y in GLYPH_PIXELS.get(glyph, ()):
+        put(pixels, x0 + x, y0 + y, color)
 
 def render_text_3x5(text, color=FG, y0=1, align="right"):
     """
     Render up to MAX 3 glyphs side-by-side on 8x8:
     - each glyph 3px wide + 1px gap except last
     - align right by default so numbers look natural
+    Frames come from a bounded LRU cache and are frozen (read-only);
+    call .copy() before drawing on one.
     """
+    return _render_cached(text, tuple(color), y0, align)
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_cached(text, color, y0, align):
+    return draw_text_3x5(text, color, y0, align).freeze()
+
+# hits / misses / currsize of the rendered-value cache
+render_cache_info = _render_cached.cache_info
+
+def draw_text_3x5(text, color=FG, y0=1, align="right"):
+    """Uncached render_text_3x5 into a fresh, writable frame."""
     text = text[:3]  # cap to 3 glyphs (we preformat to fit)
     width = 3*len(text) + max(0, len(text)-1)*1
     if align == "right":
@@ -155,10 +188,59 @@ def render_text_3x5(text, color=FG, y0=1, align="right"):
             cursor += 1  # 1 px gap
     return px
 
-def flash_message(sense, msg, color, t=0.35):
-    px = render_text_3x5(msg, color=color)
-    sense.set_pixels(px)
-    time.sleep(t)
+class TextStrip:
+    """
+    Text rendered once into a strip of columns wider than the display.
+    Each row holds the text, a gap, then the first 8 columns again, so any
+    window(ox) is 8 row slices of the strip with no wrap-around handling.
+    """
+
+    def __init__(self, text, color=FG, y0=1):
+        self.text = text
+        self.width = 4*len(text) - 1 + SCROLL_GAP   # scroll period in columns
+        self.stride = (self.width + WIDTH) * 3       # bytes per strip row
+        self.buf = bytearray(self.stride * HEIGHT)
+        c = bytes(color)
+        for i, ch in enumerate(text):
+            for x, y in GLYPH_PIXELS.get(ch, ()):
+                for col in (4*i + x, 4*i + x + self.width):
+                    if col < self.width + WIDTH:
+                        j = (y0 + y)*self.stride + col*3
+                        self.buf[j:j+3] = c
+        self._view = memoryview(self.buf)
+
+    def window(self, ox, out):
+        """Copy the 8x8 view starting at column ox into out (a Frame)."""
+        v, s = self._view, (ox % self.width) * 3
+        for y in range(HEIGHT):
+            out.buf[y*ROW:(y+1)*ROW] = v[y*self.stride + s:y*self.stride + s + ROW]
+        return out
+
+def format_full(x):
+    """Full value for scrolling: digits, '-' and '.' only."""
+    if abs(x - round(x)) < 1e-9:
+        return str(int(round(x)))
+    s = f"{x:.4f}".rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+def value_text(x):
+    """
+    (text, scrolls) NumberPad shows for x: format_value(x), or the full
+    value when that overflows a finite x, which scrolls only if it is still
+    wider than 3 glyphs (123.00001 shows a static "123").
+    """
+    s = format_value(x)
+    if s == "OF" and isfinite(x):
+        s = format_full(x)
+        return s, len(s) > 3
+    return s, False
+
+def value_frame(x):
+    """The frame NumberPad shows for x (first scroll step if it is too wide)."""
+    s, scrolls = value_text(x)
+    if scrolls:
+        return TextStrip(s).window(0, Frame())
+    return render_text_3x5(s, color=FG if s != "OF" else ERR)
 
 def format_value(x):
     """
@@ -186,88 +268,241 @@ def format_value(x):
         return s
     return "OF"
 
+# -----------------------------
+# Operations: x -> (new x, flash message, is_error); no I/O, so they can be
+# replayed headless (padReplay.py)
+# -----------------------------
+DEFAULT = 4.0
+
+def op_add(x):
+    return x + 1, "+", False
+
+def op_sub(x):
+    return x - 1, "-", False
+
+def op_square(x):
+    # square; guard overly huge magnitudes
+    nxt = x * x
+    if not isfinite(nxt) or abs(nxt) > 1e9:
+        return x, "OF", True
+    return nxt, "^", False
+
+def op_sqrt(x):
+    if x < 0:
+        return x, "ERR", True
+    return sqrt(x), "√", False
+
+def op_reset(x):
+    return DEFAULT, "rst", False
+
+OPS = {"up": op_add, "down": op_sub, "left": op_square,
+       "right": op_sqrt, "middle": op_reset}
+
 class NumberPad:
-    DEFAULT = 4.0
+    DEFAULT = DEFAULT
+    FLASH_OP = 0.18    # seconds an operation symbol is shown
+    FLASH_ERR = 0.45   # seconds an error code is shown
+    REFRESH = 0.25     # periodic redraw of x while idle
 
-    def __init__(self):
-        self.sense = SenseHat()
-        self.sense.clear()
+    def __init__(self, fb=None, sense=None, display=None, clock=None):
+        self.clock = clock or SYSTEM   # clocks.VirtualClock to simulate
+        self.sense = sense or SenseHat()
+        self.display = display or open_display(self.sense, fb)
+        self.display.clear()
         self.sense.low_light = False
+        self.latency = latency.probe("pad")
+        self.display.probe = self.latency
         self.x = self.DEFAULT
-        # Bind joystick
+        self.handlers = {
+            "up": self._on_up, "down": self._on_down, "left": self._on_left,
+            "right": self._on_right, "middle": self._on_middle,
+        }
+        # Flashes are drawn by a display thread (a task under run_async) so the
+        # joystick callbacks never sleep; a flash requested while another is
+        # pending or showing replaces it, so a burst of presses only flashes
+        # its final state.
+        self._cond = self.clock.condition()
+        self._pending = None     # (msg, color, seconds, inputs) awaiting the display thread
+        self._stop = False
+        self._worker = None
+        self._wake = None        # asyncio.Event of the display task
+        self.flashes = 0
+        self.coalesced = 0
+        # Values too wide for 3 glyphs scroll; the strip is rebuilt only when
+        # the text changes and every step reuses one frame
+        self._strip = None
+        self._scroll_x = 0
+        self._scroll_frame = Frame()
+        # Initial paint
+        self._show_value()
+
+    def _bind_joystick(self):
         self.sense.stick.direction_up = self._on_up
         self.sense.stick.direction_down = self._on_down
         self.sense.stick.direction_left = self._on_left
         self.sense.stick.direction_right = self._on_right
         self.sense.stick.direction_middle = self._on_middle
-        # Initial paint
-        self._show_value()
 
     # ---- Rendering helpers ----
     def _show_value(self):
-        s = format_value(self.x)
-        color = FG if s != "OF" else ERR
-        px = render_text_3x5(s, color=color)
-        self.sense.set_pixels(px)
+        s, scrolls = value_text(self.x)
+        if scrolls:
+            self._scroll_value()
+            return
+        self._strip = None
+        self.display.show(render_text_3x5(s, color=FG if s != "OF" else ERR))
+
+    def _scroll_value(self):
+        """Show the next scroll step of x (one column per call)."""
+        text = format_full(self.x)
+        if self._strip is None or self._strip.text != text:
+            self._strip = TextStrip(text)
+            self._scroll_x = 0
+        else:
+            self._scroll_x = (self._scroll_x + 1) % self._strip.width
+        self.display.show(self._strip.window(self._scroll_x, self._scroll_frame))
 
     def _flash_op(self, symbol):
         # brief blue flash to acknowledge operation
-        flash_message(self.sense, symbol, OP, t=0.18)
+        self._flash(symbol, OP, self.FLASH_OP)
 
     def _flash_err(self, code="ERR"):
-        flash_message(self.sense, code, ERR, t=0.45)
+        self._flash(code, ERR, self.FLASH_ERR)
+
+    def _flash(self, msg, color, t):
+        """Queue a flash for the display thread; returns immediately."""
+        with self._cond:
+            # the flash answers every input marked since the last one shown
+            answers = self.latency.take() if self.latency else ()
+            if self._pending is not None:
+                self.coalesced += 1
+                answers = list(self._pending[3]) + list(answers)
+            self._pending = (msg, color, t, answers)
+            self._cond.notify()
+        if self._wake is not None:
+            self._wake.set()
+
+    def _display_step(self, flash_until):
+        """
+        Draw a pending flash, or x once no flash is up (call with _cond
+        held). Returns the new flash_until and the seconds until the next
+        step is due.
+        """
+        if self._pending is not None:
+            msg, color, t, answers = self._pending
+            self._pending = None
+            if answers:
+                self.latency.arm(answers)
+            self.display.show(render_text_3x5(msg, color=color))
+            self.flashes += 1
+            flash_until = self.clock.monotonic() + t
+        now = self.clock.monotonic()
+        if flash_until is not None and now >= flash_until:
+            flash_until = None
+        if flash_until is None:
+            # always show the current x once no flash is up
+            self._show_value()
+            return None, 1.0 / SCROLL_FPS if self._strip is not None else self.REFRESH
+        return flash_until, flash_until - now
+
+    def _display_loop(self):
+        flash_until = None
+        with self._cond:
+            while not self._stop:
+                flash_until, wait = self._display_step(flash_until)
+                self._cond.wait(wait)
+
+    async def _display_task(self):
+        """_display_loop as an asyncio task; _flash() sets _wake."""
+        flash_until = None
+        while True:
+            self._wake.clear()
+            with self._cond:
+                flash_until, wait = self._display_step(flash_until)
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def start_display(self):
+        if self._worker is None:
+            self._stop = False
+            self._worker = self.clock.thread(self._display_loop)
+            self._worker.start()
+
+    def stop_display(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
 
     # ---- Operations ----
-    def _on_up(self, e):
+    def _apply(self, e):
         if e.action != ACTION_PRESSED: return
-        self.x += 1
-        self._flash_op("+")
-        self._show_value()
+        if self.latency: self.latency.input(e.direction)
+        self.x, msg, err = OPS[e.direction](self.x)
+        if err:
+            self._flash_err(msg)
+        else:
+            self._flash_op(msg)
+
+    def _on_up(self, e):
+        self._apply(e)
 
     def _on_down(self, e):
-        if e.action != ACTION_PRESSED: return
-        self.x -= 1
-        self._flash_op("-")
-        self._show_value()
+        self._apply(e)
 
     def _on_left(self, e):
-        if e.action != ACTION_PRESSED: return
-        # square; guard overly huge magnitudes
-        nxt = self.x * self.x
-        if not isfinite(nxt) or abs(nxt) > 1e9:
-            self._flash_err("OF")
-            return
-        self.x = nxt
-        self._flash_op("^")
-        self._show_value()
+        self._apply(e)
 
     def _on_right(self, e):
-        if e.action != ACTION_PRESSED: return
-        if self.x < 0:
-            self._flash_err("ERR")
-            return
-        self.x = sqrt(self.x)
-        self._flash_op("√")
-        self._show_value()
+        self._apply(e)
 
     def _on_middle(self, e):
-        if e.action != ACTION_PRESSED: return
-        self.x = self.DEFAULT
-        self._flash_op("rst")
-        self._show_value()
+        self._apply(e)
 
     # ---- Main loop ----
     def run(self):
+        self._bind_joystick()
+        # Event-driven: the display thread re-draws x periodically to satisfy
+        # "always show x" even after long idle; the display sink drops the
+        # redraw when nothing has changed.
+        self.start_display()
         try:
-            # Passive loop; event-driven. Keep process alive and re-draw value periodically
-            # to satisfy "always show x" even after long idle (and recover from any glitches).
-            while True:
-                self._show_value()
-                time.sleep(0.25)
+            self._worker.join()
         except KeyboardInterrupt:
             pass
         finally:
-            self.sense.clear()
+            self.stop_display()
+            self.display.clear()
+
+    async def run_async(self, rt):
+        """
+        Coroutine version of run() for the shared asyncio runtime
+        (senseRuntime.py): flashes, refreshes and scrolling run as a task on
+        the runtime's loop instead of a display thread.
+        """
+        self._wake = asyncio.Event()
+        display = asyncio.ensure_future(self._display_task())
+        try:
+            async for e in rt.joystick(self.display):
+                handler = self.handlers.get(e.direction)
+                if handler:
+                    handler(e)
+        finally:
+            display.cancel()
+            self._wake = None
 
 if __name__ == "__main__":
-    NumberPad().run()
+    import argparse
+    ap = argparse.ArgumentParser()
+    add_display_args(ap)
+    latency.add_latency_args(ap)
+    frameRecord.add_record_args(ap)
+    args = ap.parse_args()
+    latency.enable_from_args(args)
+    pad = NumberPad(fb=args.fb)
+    pad.display.recorder = frameRecord.open_from_args(args)
+    pad.run()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Clocks for the app loops: wall-clock time, or virtual time for simulation.
+
+The apps don't call time.sleep/time.monotonic or create their own threads,
+conditions and events; they ask their clock (SYSTEM unless one is passed
+in), so the same loops run in real time or on a VirtualClock:
+
+    clock = VirtualClock()
+    app = MoodAnimator(sense=FakeSenseHat(), clock=clock)
+    app.worker.start()
+    clock.sleep(3600)      # an hour of animation and idle-to-sleep, in ms
+    app.shutdown()
+
+A VirtualClock only moves when every thread it knows about is blocked in one
+of its waits (sleep, Condition.wait, Event.wait, Thread.join). It then jumps
+straight to the earliest deadline and wakes whoever was waiting for it.
+The thread that created the clock takes part, as does every thread started
+with clock.thread(). notify() and set() count their waiters as running
+again before they return, so time never moves past a deadline while a woken
+thread is still catching up.
+
+Anything else that blocks (sleeping while holding a lock another thread
+needs, I/O, plain threading primitives) holds virtual time still. If every
+thread is waiting and none has a deadline, all of their waits raise
+Stalled.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+class Stalled(RuntimeError):
+    pass
+
+class SystemClock:
+    """Real time and plain threading primitives."""
+    monotonic = staticmethod(time.monotonic)
+    sleep = staticmethod(time.sleep)
+
+    def condition(self, lock=None):
+        return threading.Condition(lock)
+
+    def event(self):
+        return threading.Event()
+
+    def thread(self, target, *args):
+        return threading.Thread(target=target, args=args, daemon=True)
+
+SYSTEM = SystemClock()
+
+class _Waiter:
+    __slots__ = ("go", "done", "notified", "stalled")
+
+    def __init__(self):
+        self.go = threading.Lock()
+        self.go.acquire()
+        self.done = False
+        self.notified = False
+        self.stalled = False
+
+class VirtualClock:
+    def __init__(self, start=0.0):
+        self.now = float(start)
+        self.jumps = 0              # times virtual time moved forward
+        self._mutex = threading.Lock()
+        self._timers = []           # heap of (deadline, seq, waiter)
+        self._blocked = set()       # waiters of every parked thread
+        self._seq = itertools.count()
+        self._running = 1           # participating threads not blocked; 1 = creator
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self._block(_Waiter(), seconds)
+
+    def condition(self, lock=None):
+        return _Condition(self, lock)
+
+    def event(self):
+        return _Event(self)
+
+    def thread(self, target, *args):
+        return _Thread(self, target, args)
+
+    # ---- scheduling (all under _mutex) ----
+    def _block(self, w, timeout=None):
+        """Park the calling thread until w is woken or timeout passes; True if notified."""
+        with self._mutex:
+            self._running -= 1
+            if not w.done:
+                self._blocked.add(w)
+                if timeout is not None:
+                    heapq.heappush(self._timers, (self.now + timeout, next(self._seq), w))
+            if self._running == 0:
+                self._advance()
+        w.go.acquire()
+        if w.stalled:
+            raise Stalled("every thread is waiting and nothing is scheduled")
+        return w.notified
+
+    def _wake(self, w, notified):
+        if w.done:
+            return False
+        w.done = True
+        w.notified = notified
+        self._blocked.discard(w)
+        self._running += 1
+        w.go.release()
+        return True
+
+    def _advance(self):
+        """Jump to the earliest live deadline and wake everything due then."""
+        timers = self._timers
+        while timers and timers[0][2].done:
+            heapq.heappop(timers)
+        if not timers:
+            for w in list(self._blocked):
+                w.stalled = True
+                self._wake(w, False)
+            return
+        self.now = max(self.now, timers[0][0])
+        self.jumps += 1
+        while timers and timers[0][0] <= self.now:
+            self._wake(heapq.heappop(timers)[2], False)
+
+    def _exited(self):
+        with self._mutex:
+            self._running -= 1
+            if self._running == 0:
+                self._advance()
+
+class _Condition(threading.Condition):
+    """threading.Condition whose waits are parked on a VirtualClock."""
+
+    def __init__(self, clock, lock=None):
+        super().__init__(lock)
+        self._clock = clock
+        self._parked = []
+
+    def wait(self, timeout=None):
+        if not self._is_owned():
+            raise RuntimeError("cannot wait on un-acquired lock")
+        w = _Waiter()
+        self._parked.append(w)
+        saved = self._release_save()
+        try:
+            return self._clock._block(w, timeout)
+        finally:
+            self._acquire_restore(saved)
+            if w in self._parked:
+                self._parked.remove(w)
+
+    def wait_for(self, predicate, timeout=None):
+        end = None if timeout is None else self._clock.now + timeout
+        result = predicate()
+        while not result:
+            if end is not None:
+                timeout = end - self._clock.now
+                if timeout <= 0:
+                    break
+            self.wait(timeout)
+            result = predicate()
+        return result
+
+    def notify(self, n=1):
+        if not self._is_owned():
+            raise RuntimeError("cannot notify on un-acquired lock")
+        with self._clock._mutex:
+            while self._parked and n > 0:
+                if self._clock._wake(self._parked.pop(0), True):
+                    n -= 1
+
+    def notify_all(self):
+        self.notify(len(self._parked))
+
+class _Event:
+    def __init__(self, clock):
+        self._cond = _Condition(clock, threading.Lock())
+        self._flag = False
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        with self._cond:
+            self._flag = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._flag = False
+
+    def wait(self, timeout=None):
+        with self._cond:
+            if not self._flag:
+                self._cond.wait(timeout)
+            return self._flag
+
+class _Thread(threading.Thread):
+    def __init__(self, clock, target, args):
+        super().__init__(target=target, args=args, daemon=True)
+        self._clock = clock
+        self._finished = _Event(clock)
+
+    def start(self):
+        with self._clock._mutex:
+            self._clock._running += 1
+        super().start()
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self._finished.set()
+            self._clock._exited()
+
+    def join(self, timeout=None):
+        if self._finished.wait(timeout):
+            super().join()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-channel colour lookup tables for whole animations.
+
+A ColorLut is three 256-entry tables (red, green, blue). Gamma correction,
+brightness, per-channel gains (device calibration, warm/cool shifts) are all
+tables, and chaining them is just more tables:
+
+    lut = gamma(2.2).then(gains(1.0, 0.9, 0.8)).then(brightness(0.5))
+    dim = lut.apply(frames)        # every frame of the animation at once
+
+apply() joins the animation's buffers and runs bytes.translate over each
+channel's stride, so a whole cached animation is recoloured in three C-level
+passes; results are meant to be cached (FrameCache does), so dimming and
+fades cost nothing per frame at render time.
+"""
+
+from ledFrame import Frame, NBYTES
+
+IDENTITY = bytes(range(256))
+
+def _table(f):
+    return bytes(max(0, min(255, int(round(f(i))))) for i in range(256))
+
+class ColorLut:
+    __slots__ = ("tables",)
+
+    def __init__(self, r=IDENTITY, g=None, b=None):
+        tables = (bytes(r), bytes(r if g is None else g), bytes(r if b is None else b))
+        if any(len(t) != 256 for t in tables):
+            raise ValueError("lookup tables need 256 entries")
+        self.tables = tables
+
+    def then(self, other):
+        """This LUT followed by other, as one LUT."""
+        return ColorLut(*(t.translate(o) for t, o in zip(self.tables, other.tables)))
+
+    def is_identity(self):
+        return all(t == IDENTITY for t in self.tables)
+
+    def color(self, rgb):
+        """One [r, g, b] through the tables."""
+        return [t[v] for t, v in zip(self.tables, rgb)]
+
+    def apply(self, frames):
+        """Frozen copies of frames with the tables applied."""
+        if not frames:
+            return ()
+        buf = bytearray(b"".join(f.buf for f in frames))
+        for c, t in enumerate(self.tables):
+            buf[c::3] = buf[c::3].translate(t)
+        return tuple(Frame(buf=bytes(buf[i:i+NBYTES])) for i in range(0, len(buf), NBYTES))
+
+    def apply_frame(self, frame):
+        return self.apply((frame,))[0]
+
+    def __eq__(self, other):
+        return isinstance(other, ColorLut) and self.tables == other.tables
+
+    def __hash__(self):
+        return hash(self.tables)
+
+def gamma(g):
+    """Gamma correction: out = 255 * (in / 255) ** g."""
+    return ColorLut(_table(lambda i: 255.0 * (i / 255.0) ** g))
+
+def brightness(k):
+    return ColorLut(_table(lambda i: i * k))
+
+def gains(r, g, b):
+    """Scale each channel separately (calibration, colour temperature)."""
+    return ColorLut(*(_table(lambda i, k=k: i * k) for k in (r, g, b)))
+
+def calibration(exponent=1.0, rgb=(1.0, 1.0, 1.0), level=1.0):
+    """Gamma exponent, then per-channel gains rgb, then brightness level."""
+    return gamma(exponent).then(gains(*rgb)).then(brightness(level))
+
+def fade(steps, start=1.0, end=0.0, base=None):
+    """steps LUTs from brightness start to end, each after base if given."""
+    base = base or ColorLut()
+    if steps < 2:
+        return [base.then(brightness(end))]
+    return [base.then(brightness(start + (end - start) * i / (steps - 1)))
+            for i in range(steps)]
+
+def add_color_args(ap):
+    ap.add_argument("--gamma", type=float, default=1.0,
+                    help="gamma correction applied to every frame (default: none)")
+    ap.add_argument("--brightness", type=float, default=1.0,
+                    help="brightness scale, 0..1 (default: %(default)s)")
+    ap.add_argument("--gains", default="1,1,1", metavar="R,G,B",
+                    help="per-channel colour calibration (default: %(default)s)")
+
+def lut_from_args(args):
+    """The LUT the options describe, or None when they change nothing."""
+    try:
+        r, g, b = (float(v) for v in args.gains.split(","))
+    except ValueError:
+        raise SystemExit("--gains needs three comma-separated numbers")
+    lut = calibration(args.gamma, (r, g, b), args.brightness)
+    return None if lut.is_identity() else lut
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Layer compositor for the emoji frames.
+
+A feature (eyes, a mouth, the face vignette...) is a Layer: the byte
+offsets of the pixels it covers plus one colour. A frame is a stack of
+layers painted bottom to top:
+
+    frame = compose(face(FACE) + [EYES, SMILE])
+
+Full-matrix layers (fill) keep only their colour and are memoized per
+colour, as are the face stacks, so a frame costs one bytearray and a slice
+write per covered pixel. Recolouring a layer (with_color) shares its
+offsets, so variations and colour shifts cost no geometry work at all.
+"""
+
+from functools import lru_cache
+
+from ledFrame import Frame, WIDTH, HEIGHT, NBYTES
+
+class Layer:
+    __slots__ = ("points", "color", "full", "offsets", "_rgb")
+
+    def __init__(self, points, color, full=False, _shared=None):
+        self.color = tuple(color)
+        self._rgb = bytes(self.color)
+        self.full = full
+        if _shared is not None:
+            self.points, self.offsets = _shared
+        elif full:
+            self.points, self.offsets = (), ()   # never read: the colour covers everything
+        else:
+            pts = tuple((x, y) for x, y in points if 0 <= x < WIDTH and 0 <= y < HEIGHT)
+            self.points = pts
+            self.offsets = tuple((y*WIDTH + x) * 3 for x, y in pts)
+
+    def with_color(self, color):
+        """Same pixels in another colour (the offsets are shared, not rebuilt)."""
+        return Layer(None, color, self.full, (self.points, self.offsets))
+
+@lru_cache(maxsize=64)
+def _fill(color):
+    return Layer(None, color, full=True)
+
+def fill(color):
+    """Layer covering the whole matrix (one per colour, shared)."""
+    return _fill(tuple(color))
+
+def dots(color, *points):
+    return Layer(points, color)
+
+def hline(y, x1, x2, color):
+    """Pixels x1..x2 (inclusive) on row y."""
+    return Layer([(x, y) for x in range(x1, x2+1)], color)
+
+def edge(color):
+    """The outermost ring of pixels."""
+    return Layer([(x, y) for y in range(HEIGHT) for x in range(WIDTH)
+                  if x in (0, WIDTH-1) or y in (0, HEIGHT-1)], color)
+
+def compose(layers):
+    """Paint layers bottom to top onto black; returns a new Frame."""
+    buf = None
+    for l in layers:
+        c = l._rgb
+        if l.full:
+            buf = bytearray(c * (WIDTH * HEIGHT))
+            continue
+        if buf is None:
+            buf = bytearray(NBYTES)
+        for i in l.offsets:
+            buf[i:i+3] = c
+    return Frame(buf=buf if buf is not None else bytearray(NBYTES))
+
+def recolor(layers, mapping):
+    """Copy of a stack with colours swapped per mapping {old rgb: new rgb}."""
+    mapping = {tuple(k): v for k, v in mapping.items()}
+    return [l.with_color(mapping[l.color]) if l.color in mapping else l for l in layers]
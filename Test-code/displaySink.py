@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Display sink shared by the Sense HAT apps.
+
+Every app draws into a Frame and hands it to a DisplaySink instead of calling
+sense.set_pixels itself. The sink remembers what it last committed to the LED
+matrix: identical frames are dropped, frames that differ by only a few pixels
+are written pixel by pixel, and everything else is one full write.
+
+Full writes go to a backend:
+- SenseBackend: sense.set_pixels / set_pixel (sense_hat or sense_emu)
+- FramebufferBackend: the LED framebuffer device memory-mapped directly and
+  fed pre-encoded RGB565 frames, skipping set_pixels' per-call conversion
+"""
+
+import glob
+import mmap
+import os
+import struct
+
+from ledFrame import NBYTES, WIDTH, RGB565, rgb565
+
+FB_BYTES = RGB565.size
+PIXEL565 = struct.Struct("=H")
+FB_NAME = "RPi-Sense FB"
+
+def find_framebuffer():
+    """Path of the Sense HAT framebuffer device, or None if there is none."""
+    for name_file in sorted(glob.glob("/sys/class/graphics/fb*/name")):
+        try:
+            with open(name_file) as f:
+                if f.read().strip() != FB_NAME:
+                    continue
+        except OSError:
+            continue
+        dev = "/dev/" + os.path.basename(os.path.dirname(name_file))
+        if os.path.exists(dev):
+            return dev
+    return None
+
+class SenseBackend:
+    """Writes through the SenseHat object (validated, converted per call)."""
+
+    def __init__(self, sense):
+        self.sense = sense
+
+    def write(self, frame):
+        self.sense.set_pixels(frame.to_pixels())
+
+    def write_pixel(self, x, y, r, g, b):
+        self.sense.set_pixel(x, y, r, g, b)
+
+    def clear(self):
+        self.sense.clear()
+
+    def close(self):
+        pass
+
+class FramebufferBackend:
+    """
+    Memory-maps the LED framebuffer (or any file standing in for /dev/fbN)
+    and copies RGB565 frames straight into it. Frozen frames are encoded once
+    and the encoding is reused on every later write.
+    """
+    ENCODED_MAX = 256  # frozen frames whose encoding is kept
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR)
+        try:
+            if os.path.isfile(path) and os.fstat(fd).st_size < FB_BYTES:
+                os.ftruncate(fd, FB_BYTES)
+            self.mm = mmap.mmap(fd, FB_BYTES)
+        finally:
+            os.close(fd)
+        self._encoded = {}
+
+    def encode(self, frame):
+        buf = frame.buf
+        if not isinstance(buf, bytes):
+            return frame.to_rgb565()
+        enc = self._encoded.get(buf)
+        if enc is None:
+            if len(self._encoded) >= self.ENCODED_MAX:
+                self._encoded.clear()
+            enc = self._encoded[buf] = frame.to_rgb565()
+        return enc
+
+    def write(self, frame):
+        if isinstance(frame.buf, bytes):
+            self.mm[0:FB_BYTES] = self.encode(frame)
+        else:
+            # encode straight into the mapping, no intermediate buffer
+            RGB565.pack_into(self.mm, 0, *frame.rgb565_words())
+
+    def write_pixel(self, x, y, r, g, b):
+        i = (y*WIDTH + x) * 2
+        PIXEL565.pack_into(self.mm, i, rgb565(r, g, b))
+
+    def clear(self):
+        self.mm[0:FB_BYTES] = bytes(FB_BYTES)
+
+    def close(self):
+        self.mm.close()
+
+class DisplaySink:
+    PARTIAL_MAX = 4  # changed pixels at or below this are written one by one
+
+    def __init__(self, backend, partial_max=PARTIAL_MAX):
+        self.backend = backend
+        self.partial_max = partial_max
+        self.last = None      # bytes of the last committed frame (None = unknown)
+        self.committed = 0    # frames that reached the display
+        self.partial = 0      # ... of which only the changed pixels were written
+        self.skipped = 0      # frames dropped because nothing changed
+        self.probe = None     # latency.Probe; show() closes the inputs armed on it
+        self.recorder = None  # frameRecord.Recorder, fed every frame shown
+
+    def show(self, frame):
+        """Commit frame to the display; returns False if it was skipped."""
+        if self.recorder is not None:
+            self.recorder.record(frame.buf)
+        written = self._show(frame)
+        if self.probe is not None:
+            self.probe.commit()
+        return written
+
+    def _show(self, frame):
+        buf = frame.buf
+        last = self.last
+        if last is not None:
+            if last == buf:
+                self.skipped += 1
+                return False
+            changed = [i for i in range(0, NBYTES, 3) if buf[i:i+3] != last[i:i+3]]
+            if len(changed) <= self.partial_max:
+                for i in changed:
+                    p = i // 3
+                    self.backend.write_pixel(p % WIDTH, p // WIDTH, buf[i], buf[i+1], buf[i+2])
+                self.partial += 1
+                self._commit(buf)
+                return True
+        self.backend.write(frame)
+        self._commit(buf)
+        return True
+
+    def _commit(self, buf):
+        self.last = bytes(buf)
+        self.committed += 1
+
+    def clear(self):
+        self.backend.clear()
+        self.last = bytes(NBYTES)
+        if self.recorder is not None:
+            self.recorder.record(self.last)
+
+    def invalidate(self):
+        """Forget the committed frame, e.g. after someone else drew on the display."""
+        self.last = None
+
+    def close(self):
+        self.backend.close()
+
+    def stats(self):
+        return {"committed": self.committed, "partial": self.partial,
+                "skipped": self.skipped}
+
+def open_display(sense, fb=None):
+    """
+    DisplaySink for an app. With fb=None the matrix is driven through sense;
+    otherwise fb names a framebuffer device or file ("" autodetects) that is
+    memory-mapped, falling back to sense when it is missing.
+    """
+    backend = None
+    if fb is not None:
+        path = fb or find_framebuffer()
+        if path:
+            try:
+                backend = FramebufferBackend(path)
+            except (OSError, ValueError):
+                backend = None
+    return DisplaySink(backend or SenseBackend(sense))
+
+def add_display_args(ap):
+    """Command-line options for choosing the display backend."""
+    ap.add_argument("--fb", nargs="?", const="", metavar="DEVICE",
+                    help="write to the memory-mapped LED framebuffer "
+                         "(autodetected unless DEVICE is given)")
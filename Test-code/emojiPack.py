@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Compiled emoji asset pack.
+
+Every AnimatedEmoji (moodAnimator.py) and every build_frames kind
+(tiltEmotions.py) is rendered once, at build time, into a single file:
+
+    header   b"EMJP", u16 version, u16 animations, u32 frames
+    index    per animation: u8 name length, name (utf-8), f32 fps,
+             u16 frame count, u32 frame number per frame
+    frames   192-byte RGB frames, each distinct frame stored once
+
+Animations are named "mood.<emoji name>" and "tilt.<kind>". At run time the
+pack is memory-mapped; opening it reads only the index, and a frame's bytes
+are copied out of the map the first time an animation using it is asked for.
+
+Usage:
+    python3 emojiPack.py build [OUT]     # default: emoji.pack
+    python3 emojiPack.py list PACK
+"""
+
+import mmap
+import struct
+
+from ledFrame import Frame, NBYTES
+
+MAGIC = b"EMJP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+ENTRY = struct.Struct("<fH")
+DEFAULT_PATH = "emoji.pack"
+
+class PackError(ValueError):
+    pass
+
+class EmojiPack:
+    """Read-only view of a pack file; frames are decoded on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_index()
+        except Exception:
+            self._map.close()
+            raise
+        self._frames = {}      # frame number -> frozen Frame
+        self._anims = {}       # name -> tuple of frozen Frames
+
+    def _read_index(self):
+        m = self._map
+        if len(m) < HEADER.size:
+            raise PackError("%s: truncated header" % self.path)
+        magic, version, count, nframes = HEADER.unpack_from(m, 0)
+        if magic != MAGIC:
+            raise PackError("%s: not an emoji pack" % self.path)
+        if version != VERSION:
+            raise PackError("%s: pack version %d, expected %d" % (self.path, version, VERSION))
+        self._index = {}
+        off = HEADER.size
+        for _ in range(count):
+            n = m[off]
+            name = m[off+1:off+1+n].decode("utf-8")
+            off += 1 + n
+            fps, length = ENTRY.unpack_from(m, off)
+            off += ENTRY.size
+            numbers = struct.unpack_from("<%dI" % length, m, off)
+            off += 4 * length
+            self._index[name] = (fps, numbers)
+        self._data = off
+        if len(m) < off + nframes * NBYTES:
+            raise PackError("%s: truncated frame data" % self.path)
+        self.frame_count = nframes
+
+    def names(self, prefix=""):
+        """Animation names in build order, optionally only those under prefix."""
+        return [n for n in self._index if n.startswith(prefix)]
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def fps(self, name):
+        return self._index[name][0]
+
+    def frames(self, name):
+        frames = self._anims.get(name)
+        if frames is None:
+            frames = self._anims[name] = tuple(self._frame(i) for i in self._index[name][1])
+        return frames
+
+    def _frame(self, i):
+        f = self._frames.get(i)
+        if f is None:
+            off = self._data + i * NBYTES
+            f = self._frames[i] = Frame(buf=self._map[off:off+NBYTES])
+        return f
+
+    def decoded(self):
+        """Number of distinct frames decoded so far."""
+        return len(self._frames)
+
+    def close(self):
+        self._anims.clear()
+        self._frames.clear()
+        self._map.close()
+
+def write(path, animations):
+    """Write (name, fps, frames) animations to path."""
+    index = []
+    blobs = []
+    numbers = {}           # frame bytes -> frame number
+    for name, fps, frames in animations:
+        refs = []
+        for f in frames:
+            b = bytes(f.buf)
+            i = numbers.get(b)
+            if i is None:
+                i = numbers[b] = len(blobs)
+                blobs.append(b)
+            refs.append(i)
+        raw = name.encode("utf-8")
+        index.append(bytes([len(raw)]) + raw + ENTRY.pack(fps, len(refs)) +
+                     struct.pack("<%dI" % len(refs), *refs))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), len(blobs)))
+        f.writelines(index)
+        f.writelines(blobs)
+    return len(index), len(blobs)
+
+def collect():
+    """(name, fps, frames) for every animation the apps can draw."""
+    try:
+        import moodAnimator
+    except ImportError:
+        # building off-device: nothing is displayed, any SenseHat will do
+        import fakeSense
+        fakeSense.install()
+        import moodAnimator
+    import tiltEmotions
+    for cls in moodAnimator.AnimatedEmoji.__subclasses__():
+        if cls is moodAnimator.PackedEmoji:
+            continue
+        emo = cls()
+        yield "mood." + emo.name, emo.fps(), emo.frames()
+    for kind in tiltEmotions.KINDS:
+        yield "tilt." + kind, tiltEmotions.kind_fps(kind), tiltEmotions.build_frames(kind)
+
+def build(path=DEFAULT_PATH):
+    return write(path, collect())
+
+def add_pack_args(ap):
+    ap.add_argument("--pack", metavar="FILE",
+                    help="load animations from a compiled emoji pack "
+                         "(python3 emojiPack.py build)")
+
+def open_from_args(args):
+    return EmojiPack(args.pack) if args.pack else None
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("build", help="compile all animations into a pack")
+    p.add_argument("out", nargs="?", default=DEFAULT_PATH)
+    p = sub.add_parser("list", help="show a pack's animations")
+    p.add_argument("pack")
+    args = ap.parse_args()
+    if args.cmd == "build":
+        anims, frames = build(args.out)
+        print("%s: %d animations, %d distinct frames" % (args.out, anims, frames))
+    else:
+        pack = EmojiPack(args.pack)
+        for name in pack.names():
+            print("%-16s %4.1f fps  %d frames" % (name, pack.fps(name), len(pack.frames(name))))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Palette and face layers shared by moodAnimator.py and tiltEmotions.py.
+
+Only what both apps draw identically lives here; each app keeps its own
+variants (the two sets of sunglasses and heart eyes differ by a pixel or two).
+"""
+
+from functools import lru_cache
+
+from compositor import fill, dots, hline, edge
+
+# Basic colours (at least three per frame will be used)
+BLACK = [0, 0, 0]
+DIM = [5, 5, 5]
+FACE = [255, 200, 0]      # yellow face
+EYE = [0, 0, 0]           # black eyes
+MOUTH = [200, 0, 0]       # red mouth
+BLUSH = [255, 105, 97]    # coral
+TEAR = [64, 180, 255]     # blue tear
+ANGRY = [255, 50, 10]     # angry brow
+COOL = [120, 200, 255]    # cyan sunglasses
+LOVE = [255, 0, 100]      # pink heart
+WOW = [255, 255, 255]     # white highlight
+BKG = [10, 10, 20]        # subtle background
+
+VIGNETTE = edge(BKG)
+
+@lru_cache(maxsize=64)
+def _face(base_color):
+    return (fill(base_color), VIGNETTE)  # vignette border
+
+def face(base_color=FACE):
+    """Bottom of every face stack; the layers are shared per colour."""
+    return list(_face(tuple(base_color)))
+
+def eyes(x1, x2, y=2, eye_color=EYE):
+    return dots(eye_color, (x1, y), (x2, y))
+
+def mouth_line(y, x1=2, x2=5, color=MOUTH):
+    return hline(y, x1, x2, color)
+
+def mouth_arc_smile(color=MOUTH):
+    return dots(color, (2, 5), (5, 5), (3, 6), (4, 6))
+
+def mouth_arc_sad(color=MOUTH):
+    return dots(color, (2, 6), (5, 6), (3, 5), (4, 5))
+
+EYES = eyes(2, 5)
+WOW_EYES = eyes(2, 5, 2, WOW)
+SMILE = mouth_arc_smile()
+FROWN = mouth_arc_sad()
+BROWS = dots(ANGRY, (1, 1), (2, 1), (5, 1), (6, 1))
+WOW_MOUTH = dots(WOW, (3, 5), (4, 5), (3, 6), (4, 6))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for sense_hat.SenseHat.
+
+Used by the benchmarks (and anything else that needs the apps without a
+board or the emulator). Installing it puts this module in place of
+sense_hat/sense_emu, so the apps' own `SenseHat()` calls get a FakeSenseHat:
+
+    import fakeSense
+    fakeSense.install()
+    import moodAnimator   # now drives the fake
+
+- set_pixels/set_pixel/clear validate like the real library, record the
+  matrix and count calls; on_write (if set) is called after every write
+- stick.press(direction) delivers an InputEvent to the bound callbacks
+- get_orientation_degrees() replays a scripted list of (pitch, roll, yaw)
+"""
+
+import sys
+import time
+from collections import namedtuple
+
+ACTION_PRESSED = "pressed"
+ACTION_RELEASED = "released"
+ACTION_HELD = "held"
+
+InputEvent = namedtuple("InputEvent", ("timestamp", "direction", "action"))
+
+def install():
+    """Make `from sense_hat import ...` (and sense_emu) resolve to this module."""
+    mod = sys.modules[__name__]
+    sys.modules["sense_hat"] = mod
+    sys.modules["sense_emu"] = mod
+    return mod
+
+class FakeStick:
+    DIRECTIONS = ("up", "down", "left", "right", "middle")
+
+    def __init__(self):
+        self.direction_up = None
+        self.direction_down = None
+        self.direction_left = None
+        self.direction_right = None
+        self.direction_middle = None
+        self.direction_any = None
+        self.events = []
+
+    def press(self, direction, action=ACTION_PRESSED):
+        """Deliver one event the way sense_hat's stick thread does."""
+        e = InputEvent(time.time(), direction, action)
+        self.events.append(e)
+        for cb in (getattr(self, "direction_" + direction), self.direction_any):
+            if cb is not None:
+                cb(e)
+        return e
+
+    def click(self, direction):
+        self.press(direction, ACTION_PRESSED)
+        self.press(direction, ACTION_RELEASED)
+
+    def get_events(self):
+        events, self.events = self.events, []
+        return events
+
+class FakeSenseHat:
+    def __init__(self, orientation=None):
+        self.stick = FakeStick()
+        self.low_light = False
+        self.rotation = 0
+        self.pixels = [[0, 0, 0] for _ in range(64)]
+        self.set_pixels_calls = 0
+        self.set_pixel_calls = 0
+        self.clear_calls = 0
+        self.on_write = None
+        self.gyro = {"x": 0.0, "y": 0.0, "z": 0.0}
+        self.script_orientation(orientation or [(0.0, 0.0, 0.0)])
+
+    # ---- LED matrix ----
+    def set_pixels(self, pixel_list):
+        if len(pixel_list) != 64:
+            raise ValueError("Pixel lists must have 64 elements")
+        for i, pix in enumerate(pixel_list):
+            if len(pix) != 3:
+                raise ValueError("Pixel at index %d is invalid. Pixels must contain 3 elements: Red, Green and Blue" % i)
+            for v in pix:
+                if v > 255 or v < 0:
+                    raise ValueError("Pixel at index %d is invalid. Pixel elements must be between 0 and 255" % i)
+            self.pixels[i] = list(pix)
+        self.set_pixels_calls += 1
+        self._written()
+
+    def set_pixel(self, x, y, *args):
+        pix = args[0] if len(args) == 1 else args
+        if not (0 <= x < 8 and 0 <= y < 8):
+            raise ValueError("X/Y position must be between 0 and 7")
+        self.pixels[y*8 + x] = list(pix)
+        self.set_pixel_calls += 1
+        self._written()
+
+    def get_pixels(self):
+        return [list(p) for p in self.pixels]
+
+    def clear(self, *args):
+        colour = args[0] if len(args) == 1 else (args or (0, 0, 0))
+        self.pixels = [list(colour) for _ in range(64)]
+        self.clear_calls += 1
+        self._written()
+
+    def _written(self):
+        if self.on_write is not None:
+            self.on_write()
+
+    # ---- IMU ----
+    def script_orientation(self, samples):
+        """
+        Samples are (pitch, roll, yaw) degrees, returned exactly as given;
+        the last one repeats once the script is exhausted.
+        """
+        self._orientation = list(samples)
+        self._orientation_i = 0
+
+    def set_orientation(self, pitch, roll, yaw=0.0):
+        self.script_orientation([(pitch, roll, yaw)])
+
+    def get_orientation_degrees(self):
+        i = min(self._orientation_i, len(self._orientation) - 1)
+        self._orientation_i += 1
+        pitch, roll, yaw = self._orientation[i]
+        return {"pitch": pitch, "roll": roll, "yaw": yaw}
+
+    get_orientation = get_orientation_degrees
+
+    def get_gyroscope_raw(self):
+        return dict(self.gyro)
+
+SenseHat = FakeSenseHat
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Session recording and replay.
+
+A Recorder attached to a DisplaySink (sink.recorder, or --record FILE on
+any app) logs every frame the app shows, with its time, into a compact
+file:
+
+    b"EMJR" u8 version
+    zlib stream of records:
+        varint  microseconds since the previous record
+        u8      n: changed pixels against the previous frame, or KEYFRAME
+        n * (u8 pixel, r, g, b)    or 192 bytes for a keyframe
+
+Unchanged frames cost two or three bytes before compression, and
+animations repeat, so zlib takes the rest down to a few bytes a frame. The
+stream is sync-flushed every FLUSH_EVERY seconds, so a crashed session
+loses at most that much.
+
+Replay reads the file as a stream and shows the frames at their original
+pace, faster or slower (speed), or as fast as possible (speed=0).
+
+Usage:
+    python3 frameRecord.py info FILE
+    python3 frameRecord.py play FILE [--speed X] [--fb [DEVICE]] [--fake]
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+import zlib
+
+from ledFrame import Frame, NBYTES
+from displaySink import open_display, add_display_args
+
+MAGIC = b"EMJR"
+VERSION = 1
+KEYFRAME = 255
+FLUSH_EVERY = 1.0
+CHUNK = 16384
+
+class RecordError(ValueError):
+    pass
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+class Recorder:
+    """Appends frames to a recording; record() may be called from any thread."""
+
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self._f = open(path, "wb")
+        self._f.write(MAGIC + bytes([VERSION]))
+        self._z = zlib.compressobj(9)
+        self._lock = threading.Lock()
+        self._last = None
+        self._last_ts = None
+        self._flushed = clock()
+        self.frames = 0
+        self.keyframes = 0
+        self.raw_bytes = 0
+
+    def record(self, buf, ts=None):
+        """Log one frame (its 192-byte buffer) shown at ts (default: now)."""
+        if ts is None:
+            ts = self.clock()
+        with self._lock:
+            if self._f is None:
+                return
+            last = self._last
+            rec = _varint(0 if self._last_ts is None else max(0, round((ts - self._last_ts) * 1e6)))
+            self._last_ts = ts
+            if last is None:
+                changed = None
+            else:
+                changed = [i for i in range(0, NBYTES, 3) if buf[i:i+3] != last[i:i+3]]
+            if changed is None or 4 * len(changed) >= NBYTES:
+                rec.append(KEYFRAME)
+                rec += buf
+                self.keyframes += 1
+            else:
+                rec.append(len(changed))
+                for i in changed:
+                    rec.append(i // 3)
+                    rec += buf[i:i+3]
+            self._last = bytes(buf)
+            self.frames += 1
+            self.raw_bytes += len(rec)
+            self._f.write(self._z.compress(rec))
+            if ts - self._flushed >= FLUSH_EVERY:
+                self._f.write(self._z.flush(zlib.Z_SYNC_FLUSH))
+                self._f.flush()
+                self._flushed = ts
+
+    def close(self):
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.write(self._z.flush())
+            self._f.close()
+            self._f = None
+
+    def stats(self):
+        return {"frames": self.frames, "keyframes": self.keyframes,
+                "raw_bytes": self.raw_bytes}
+
+class _Stream:
+    """Decompresses a recording on demand."""
+
+    def __init__(self, f):
+        self.f = f
+        self.z = zlib.decompressobj()
+        self.buf = bytearray()
+        self.pos = 0
+
+    def take(self, n):
+        while len(self.buf) - self.pos < n:
+            data = self.f.read(CHUNK)
+            if not data:
+                more = self.z.flush()
+                if not more:
+                    return None  # end of recording (or cut short)
+            else:
+                try:
+                    more = self.z.decompress(data)
+                except zlib.error as e:
+                    raise RecordError("corrupt recording: %s" % e)
+            del self.buf[:self.pos]
+            self.pos = 0
+            self.buf += more
+        out = self.buf[self.pos:self.pos+n]
+        self.pos += n
+        return out
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            b = self.take(1)
+            if b is None:
+                return None
+            n |= (b[0] & 0x7f) << shift
+            if b[0] < 0x80:
+                return n
+            shift += 7
+
+def read(path):
+    """Yield (seconds since the first frame, frozen Frame) from a recording."""
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC) + 1)
+        if head[:len(MAGIC)] != MAGIC:
+            raise RecordError("%s: not a frame recording" % path)
+        if head[len(MAGIC):] != bytes([VERSION]):
+            raise RecordError("%s: unsupported recording version" % path)
+        s = _Stream(f)
+        buf = bytearray(NBYTES)
+        t = 0
+        while True:
+            dt = s.varint()
+            n = s.take(1)
+            if dt is None or n is None:
+                return
+            t += dt
+            n = n[0]
+            if n == KEYFRAME:
+                body = s.take(NBYTES)
+                if body is None:
+                    return
+                buf[:] = body
+            else:
+                body = s.take(4 * n)
+                if body is None:
+                    return
+                for j in range(0, len(body), 4):
+                    i = body[j] * 3
+                    buf[i:i+3] = body[j+1:j+4]
+            yield t / 1e6, Frame(buf=bytes(buf))
+
+def replay(path, display, speed=1.0, sleep=time.sleep, clock=time.monotonic):
+    """Show a recording on display; speed 2 is twice as fast, 0 is flat out."""
+    start = clock()
+    n = 0
+    for t, frame in read(path):
+        if speed:
+            delay = start + t / speed - clock()
+            if delay > 0:
+                sleep(delay)
+        display.show(frame)
+        n += 1
+    return n
+
+def info(path):
+    frames = 0
+    t = 0.0
+    for t, _ in read(path):
+        frames += 1
+    size = os.path.getsize(path)
+    return {"frames": frames, "seconds": t, "bytes": size,
+            "bytes_per_frame": size / frames if frames else 0.0,
+            "python_list_bytes": frames * _pixel_list_bytes()}
+
+def _pixel_list_bytes():
+    """What one frame costs as the apps' old list of 64 [r, g, b] lists."""
+    px = [[255, 200, 0] for _ in range(64)]
+    return sys.getsizeof(px) + sum(sys.getsizeof(p) for p in px)
+
+def add_record_args(ap):
+    ap.add_argument("--record", metavar="FILE",
+                    help="record every frame shown to FILE (frameRecord.py play FILE)")
+
+def open_from_args(args):
+    """Recorder for --record, closed at exit; None without it."""
+    if not args.record:
+        return None
+    rec = Recorder(args.record)
+    atexit.register(rec.close)
+    return rec
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("info", help="frames, length and size of a recording")
+    p.add_argument("file")
+    p = sub.add_parser("play", help="replay a recording on the LED matrix")
+    p.add_argument("file")
+    p.add_argument("--speed", type=float, default=1.0,
+                   help="playback speed (0: as fast as possible)")
+    p.add_argument("--fake", action="store_true", help="use fakeSense instead of a board")
+    add_display_args(p)
+    args = ap.parse_args()
+    if args.cmd == "info":
+        print(json.dumps(info(args.file), indent=2))
+    else:
+        if args.fake:
+            import fakeSense
+            fakeSense.install()
+        try:
+            from sense_hat import SenseHat
+        except ImportError:
+            from sense_emu import SenseHat
+        display = open_display(SenseHat(), args.fb)
+        try:
+            print("%d frames" % replay(args.file, display, args.speed))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Deadline-based frame pacing for the animation loops.
+
+Frame k of a run is due at origin + k / fps, an absolute monotonic time, so
+the time spent building and writing a frame never pushes later frames back.
+When a loop falls behind, tick() skips straight to the frame that should be
+on screen now and counts the ones it passed over as dropped:
+
+    sched = FrameScheduler(fps)
+    while ...:
+        k = sched.tick()              # index of the frame to show now
+        show(frames[k % len(frames)])
+        sleep(sched.deadline - time.monotonic())
+
+reset() starts a new run (new animation, new fps, or showing something right
+away after input) without losing the statistics gathered so far.
+"""
+
+import time
+
+class FrameScheduler:
+    def __init__(self, fps, clock=time.monotonic):
+        self.clock = clock
+        self.shown = 0
+        self.dropped = 0
+        self.late_total = 0.0   # seconds frames were shown after their deadline
+        self.late_max = 0.0
+        self.intervals = 0      # frame-to-frame intervals within a run
+        self.active = 0.0       # ... and the time they covered
+        self.reset(fps=fps)
+
+    def reset(self, now=None, fps=None):
+        """Start a run: the next tick() shows frame 0, due at now."""
+        if fps is not None:
+            self.fps = float(fps)
+            self.period = 1.0 / self.fps
+        self.origin = self.clock() if now is None else now
+        self.next = 0
+        self.deadline = self.origin
+        self._last = None
+
+    def tick(self, now=None, last=None):
+        """
+        Index of the frame to show at now, skipping any that are overdue.
+        A one-shot sequence passes its last index so its final frame is
+        never skipped.
+        """
+        if now is None:
+            now = self.clock()
+        k = max(self.next, int((now - self.origin) * self.fps))
+        if last is not None and k > last:
+            k = max(self.next, last)
+        self.dropped += k - self.next
+        late = now - (self.origin + k * self.period)
+        self.late_total += late
+        if late > self.late_max:
+            self.late_max = late
+        if self._last is not None:
+            self.intervals += 1
+            self.active += now - self._last
+        self._last = now
+        self.shown += 1
+        self.next = k + 1
+        self.deadline = self.origin + self.next * self.period
+        return k
+
+    def remaining(self, now=None):
+        """Seconds until the next frame is due (<= 0 when it already is)."""
+        return self.deadline - (self.clock() if now is None else now)
+
+    def stats(self):
+        return {"target_fps": self.fps,
+                "achieved_fps": self.intervals / self.active if self.active else 0.0,
+                "shown": self.shown, "dropped": self.dropped,
+                "jitter_mean_ms": self.late_total / self.shown * 1e3 if self.shown else 0.0,
+                "jitter_max_ms": self.late_max * 1e3}
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Out-of-process rendering through shared memory.
+
+With --renderer an app keeps building frames, reading the IMU and handling
+the joystick in its own process, but the LED writes happen in a separate
+renderer process with its own interpreter (and GIL). The two share one
+multiprocessing.shared_memory block:
+
+    u32 seq        frames published; frame seq lives in slot seq % 2
+    u32 shown      last seq the renderer picked up
+    u32 drawn      frames the renderer has shown
+    u32 stop       set by the app to shut the renderer down
+    2 * slot       double-buffered frames, each:
+        u32 begin      seq of the frame being written here
+        u32 end        seq of the last frame completely written here
+        192 bytes      RGB
+
+SharedSink.show() writes frame seq into slot seq % 2 (begin, pixels, then
+end), bumps seq and wakes the renderer: no pickling, no pipe, no queue.
+The renderer reads end, copies the newest slot and reads begin; unless
+both equal the seq it asked for, the writer came back to that slot
+mid-copy and it reads again. The frame is then shown on an ordinary
+DisplaySink. Frames published faster than the renderer draws are simply
+superseded; it always shows the newest one.
+
+The renderer drives the matrix through sense_hat/sense_emu, or with --fb
+through the framebuffer (any file works as one, so this runs on plain Linux
+with no board or emulator). An app running on fakeSense gets a fakeSense
+renderer.
+
+Usage:
+    python3 moodAnimator.py --renderer [--fb [DEVICE]]
+    python3 tiltEmotions.py --renderer [--fb [DEVICE]]
+"""
+
+import atexit
+import multiprocessing
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+from ledFrame import Frame, NBYTES
+
+HEADER = struct.Struct("<4I")
+SEQ, SHOWN, DRAWN, STOP = range(4)
+SLOT = struct.Struct("<2I")   # begin, end
+SLOT_SIZE = SLOT.size + NBYTES
+SIZE = HEADER.size + 2 * SLOT_SIZE
+IDLE_WAKE = 0.5     # seconds the renderer sleeps without a wake-up
+START_TIMEOUT = 10.0
+
+def _get(mem, i):
+    return struct.unpack_from("<I", mem, 4 * i)[0]
+
+def _set(mem, i, v):
+    struct.pack_into("<I", mem, 4 * i, v & 0xffffffff)
+
+def _slot(seq):
+    """Offset of the slot frame seq goes to."""
+    return HEADER.size + (seq & 1) * SLOT_SIZE
+
+def write_frame(mem, seq, buf):
+    """Store frame seq in its slot and publish it (single writer)."""
+    i = _slot(seq)
+    seq &= 0xffffffff
+    struct.pack_into("<I", mem, i, seq)          # begin: slot is busy
+    mem[i + SLOT.size:i + SLOT_SIZE] = buf
+    struct.pack_into("<I", mem, i + 4, seq)      # end: slot holds seq
+    _set(mem, SEQ, seq)
+
+def read_frame(mem):
+    """(seq, bytes) of the newest complete frame in a shared block."""
+    while True:
+        seq = _get(mem, SEQ)
+        i = _slot(seq)
+        end = struct.unpack_from("<I", mem, i + 4)[0]
+        buf = bytes(mem[i + SLOT.size:i + SLOT_SIZE])
+        begin = struct.unpack_from("<I", mem, i)[0]
+        # begin is written before the pixels and end after them, so equal
+        # values bracket a copy no write overlapped
+        if begin == end == seq:
+            return seq, buf
+
+def _render(name, fb, fake, wake, ready):
+    """Renderer process: show every new frame published in block name."""
+    if fake:
+        import fakeSense
+        fakeSense.install()
+    from displaySink import open_display, SenseBackend
+    shm = shared_memory.SharedMemory(name)
+    mem = shm.buf
+    display = open_display(None, fb)
+    if isinstance(display.backend, SenseBackend):
+        # no framebuffer asked for (or none found): draw through the library
+        try:
+            from sense_hat import SenseHat
+        except ImportError:
+            from sense_emu import SenseHat
+        display.backend.sense = SenseHat()
+    ready.set()
+    shown = drawn = 0
+    try:
+        while not _get(mem, STOP):
+            wake.wait(IDLE_WAKE)
+            wake.clear()
+            # seq is bumped before every wake-up, so a publish racing the
+            # clear above is still seen here
+            if _get(mem, SEQ) == shown:
+                continue
+            shown, buf = read_frame(mem)
+            display.show(Frame(buf=buf))
+            drawn += 1
+            _set(mem, DRAWN, drawn)
+            _set(mem, SHOWN, shown)
+    except KeyboardInterrupt:
+        pass  # the app shuts us down
+    finally:
+        display.close()
+        del mem
+        shm.close()
+
+def _fake_sense():
+    mod = sys.modules.get("sense_hat")
+    return mod is not None and mod.__name__ == "fakeSense"
+
+class SharedSink:
+    """
+    Display for an app whose frames are drawn by a renderer process.
+    Drop-in for DisplaySink; show() only copies 192 bytes into shared
+    memory, so the app never waits for the LED write.
+    """
+
+    def __init__(self, fb=None, fake=None):
+        if fake is None:
+            fake = _fake_sense()
+        self.shm = shared_memory.SharedMemory(create=True, size=SIZE)
+        self.mem = self.shm.buf
+        self.mem[:SIZE] = bytes(SIZE)
+        ctx = multiprocessing.get_context("spawn")
+        self.wake = ctx.Event()
+        ready = ctx.Event()
+        self.process = ctx.Process(target=_render, name="renderer",
+                                   args=(self.shm.name, fb, fake, self.wake, ready),
+                                   daemon=True)
+        self.process.start()
+        if not ready.wait(START_TIMEOUT):
+            self.close()
+            raise RuntimeError("renderer process did not start")
+        self.seq = 0
+        self.last = None
+        self.published = 0
+        self.skipped = 0
+        self.probe = None
+        self.recorder = None
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _publish(self, buf):
+        seq = self.seq + 1
+        write_frame(self.mem, seq, buf)
+        self.seq = seq
+        self.wake.set()
+
+    def show(self, frame):
+        if self.recorder is not None:
+            self.recorder.record(frame.buf)
+        buf = frame.buf
+        written = buf != self.last
+        if written:
+            self.last = bytes(buf)
+            self.published += 1
+            self._publish(self.last)
+        else:
+            self.skipped += 1
+        if self.probe is not None:
+            self.probe.commit()
+        return written
+
+    def clear(self):
+        self.last = bytes(NBYTES)
+        self._publish(self.last)
+        if self.recorder is not None:
+            self.recorder.record(self.last)
+
+    def invalidate(self):
+        self.last = None
+
+    def flush(self, timeout=1.0):
+        """Wait until the renderer has picked up the newest frame."""
+        end = time.monotonic() + timeout
+        while _get(self.mem, SHOWN) != self.seq and self.process.is_alive():
+            if time.monotonic() >= end:
+                return False
+            time.sleep(0.001)
+        return _get(self.mem, SHOWN) == self.seq
+
+    def close(self):
+        if self.shm is None:
+            return
+        _set(self.mem, STOP, 1)
+        self.wake.set()
+        self.process.join(2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.mem = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def stats(self):
+        if self.shm is None:
+            return {"published": self.published, "skipped": self.skipped}
+        shown = _get(self.mem, SHOWN)   # before drawn, which the renderer bumps first
+        drawn = _get(self.mem, DRAWN)
+        return {"published": self.published, "skipped": self.skipped,
+                "drawn": drawn, "superseded": max(0, shown - drawn),
+                "pending": self.seq - shown}
+
+def add_renderer_args(ap):
+    ap.add_argument("--renderer", action="store_true",
+                    help="write to the LEDs from a separate process (shared memory)")
+
+def open_from_args(args):
+    """SharedSink for --renderer (honouring --fb), closed at exit; None without it."""
+    if not args.renderer:
+        return None
+    sink = SharedSink(args.fb)
+    atexit.register(sink.close)
+    return sink
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Frame streaming: one renderer, many displays.
+
+A MoodAnimator or TiltEmotions instance renders as usual but draws on a
+StreamSink, which publishes every new frame through a FrameServer to any
+number of clients over TCP or a Unix socket. Clients only decode and blit.
+
+Protocol:
+
+    server -> client
+    b"K" + 192 bytes                 keyframe (whole RGB frame)
+    b"D" + u8 n + n * (u8 pixel, r, g, b)
+                                     delta against the previous frame sent
+                                     to this client
+    client -> server
+    b"A"                             ack, once the frame has been shown
+
+Each client gets a keyframe first, then deltas whenever few enough pixels
+changed. At most WINDOW frames may be unacknowledged; the server never
+queues more than that per client, it just remembers the newest frame. A
+slow client therefore skips the frames published while it was busy and
+resumes with one delta against what it last received, however large the
+socket buffers are. A client that acks nothing for STALL_TIMEOUT seconds is
+disconnected. Deltas are encoded once per distinct base frame, so clients
+that keep up share the same bytes.
+
+Addresses are "unix:PATH", "HOST:PORT" or ":PORT".
+
+Usage:
+    python3 frameStream.py serve mood|tilt --listen ADDR [--no-local] [--fb] [--pack FILE]
+    python3 frameStream.py client --connect ADDR [--fb [DEVICE]] [--fake]
+    python3 frameStream.py swarm N --connect ADDR [--seconds S] [--slow K --delay D]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+from ledFrame import Frame, NBYTES
+
+KEY = b"K"
+DELTA = b"D"
+ACK = b"A"
+DELTA_MAX = 40          # changed pixels above this are sent as a keyframe
+WINDOW = 2              # frames in flight per client
+STALL_TIMEOUT = 5.0     # seconds a client may go without acking
+BACKLOG = 1024          # pending connections (hundreds of clients at once)
+
+class ProtocolError(ValueError):
+    pass
+
+def encode(base, frame):
+    """Message taking a client from base (bytes or None) to frame (bytes)."""
+    if base is None:
+        return KEY + frame
+    out = bytearray(DELTA + b"\0")
+    n = 0
+    for i in range(0, NBYTES, 3):
+        px = frame[i:i+3]
+        if px != base[i:i+3]:
+            n += 1
+            if n > DELTA_MAX:
+                return KEY + frame
+            out.append(i // 3)
+            out += px
+    out[1] = n
+    return bytes(out)
+
+def apply_delta(buf, body):
+    """Apply the n * 4 byte body of a delta message to buf in place."""
+    for j in range(0, len(body), 4):
+        i = body[j] * 3
+        if i >= NBYTES:
+            raise ProtocolError("pixel %d out of range" % body[j])
+        buf[i:i+3] = body[j+1:j+4]
+
+def parse_address(addr):
+    """("unix", path) or ("tcp", (host, port))."""
+    if addr.startswith("unix:"):
+        return "unix", addr[5:]
+    host, sep, port = addr.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError("bad address %r (unix:PATH or HOST:PORT)" % addr)
+    return "tcp", (host or "127.0.0.1", int(port))
+
+async def open_connection(addr):
+    kind, where = parse_address(addr)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(where)
+    return await asyncio.open_connection(*where)
+
+def _remove_socket(path):
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+class _Subscriber:
+    __slots__ = ("seq", "frame", "sent", "dropped", "unacked", "acked", "gone", "closed")
+
+    def __init__(self):
+        self.seq = None       # sequence number of the last frame sent
+        self.frame = None
+        self.sent = 0
+        self.dropped = 0
+        self.unacked = 0
+        self.acked = asyncio.Event()
+        self.gone = False
+        self.closed = asyncio.Event()   # set with gone, for waiting on it
+
+class FrameServer:
+    """Publishes frames to every connected client; runs on its own thread."""
+
+    def __init__(self, address):
+        self.address = address
+        self.seq = 0
+        self.frame = None
+        self.clients = set()
+        self.connected = 0
+        self.stalled = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes = 0
+        self.dropped = 0
+        self._memo = {}             # base seq -> message to the current frame
+        self._new = None
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    # ---- renderer side (any thread) ----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            raise OSError("cannot listen on %s" % self.address)
+        return self
+
+    def publish(self, frame):
+        """Make frame (192 bytes) the current frame for all clients."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._publish, bytes(frame))
+
+    def close(self):
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+
+    def stats(self):
+        return {"clients": len(self.clients), "connected": self.connected,
+                "stalled": self.stalled, "frames": self.seq,
+                "keyframes": self.keyframes, "deltas": self.deltas,
+                "bytes": self.bytes, "dropped": self.dropped}
+
+    # ---- server thread ----
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._new = asyncio.Event()
+        try:
+            kind, where = parse_address(self.address)
+            if kind == "unix":
+                _remove_socket(where)  # left over from a previous run
+                start = asyncio.start_unix_server(self._serve, where, backlog=BACKLOG)
+            else:
+                start = asyncio.start_server(self._serve, *where, backlog=BACKLOG)
+            self._server = loop.run_until_complete(start)
+        except OSError:
+            self._loop = None
+            self._ready.set()
+            loop.close()
+            return
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            if kind == "unix":
+                _remove_socket(where)
+            self._loop = None
+            loop.close()
+
+    def _publish(self, frame):
+        if frame == self.frame:
+            return
+        self.frame = frame
+        self.seq += 1
+        self._memo.clear()
+        self._new.set()
+        self._new = asyncio.Event()
+
+    def _message(self, sub):
+        msg = self._memo.get(sub.seq)
+        if msg is None:
+            msg = self._memo[sub.seq] = encode(sub.frame, self.frame)
+        return msg
+
+    async def _read_acks(self, reader, sub):
+        try:
+            while True:
+                data = await reader.read(64)
+                if not data:
+                    break
+                sub.unacked = max(0, sub.unacked - data.count(ACK))
+                sub.acked.set()
+        except ConnectionError:
+            pass
+        sub.gone = True
+        sub.acked.set()
+        sub.closed.set()
+
+    async def _wait_new(self, sub):
+        """Until the next publish or until the client goes away."""
+        new = asyncio.ensure_future(self._new.wait())
+        closed = asyncio.ensure_future(sub.closed.wait())
+        try:
+            await asyncio.wait((new, closed), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            new.cancel()
+            closed.cancel()
+
+    async def _serve(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sub = _Subscriber()
+        self.clients.add(sub)
+        self.connected += 1
+        acks = asyncio.ensure_future(self._read_acks(reader, sub))
+        try:
+            while not sub.gone:
+                # an idle renderer publishes nothing: also wake when the
+                # client disconnects, so it doesn't linger in self.clients
+                while (self.frame is None or sub.seq == self.seq) and not sub.gone:
+                    await self._wait_new(sub)
+                while sub.unacked >= WINDOW and not sub.gone:
+                    sub.acked.clear()
+                    try:
+                        await asyncio.wait_for(sub.acked.wait(), STALL_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        self.stalled += 1
+                        return
+                if sub.gone:
+                    break
+                msg = self._message(sub)
+                if sub.seq is not None and self.seq - sub.seq > 1:
+                    skipped = self.seq - sub.seq - 1
+                    sub.dropped += skipped
+                    self.dropped += skipped
+                sub.seq, sub.frame = self.seq, self.frame
+                writer.write(msg)
+                sub.unacked += 1
+                sub.sent += 1
+                self.bytes += len(msg)
+                if msg[:1] == KEY:
+                    self.keyframes += 1
+                else:
+                    self.deltas += 1
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            acks.cancel()
+            self.clients.discard(sub)
+            writer.close()
+
+class StreamSink:
+    """
+    Display for the renderer: frames go to a FrameServer and, if given, to a
+    local DisplaySink as well. Drop-in for DisplaySink; show() may be called
+    from any thread.
+    """
+
+    def __init__(self, server, local=None):
+        self.server = server
+        self.local = local
+        self.last = None
+        self.committed = 0
+        self.skipped = 0
+        self.probe = None
+
+    def show(self, frame):
+        if self.local is not None:
+            self.local.show(frame)
+        buf = bytes(frame.buf)
+        written = buf != self.last
+        if written:
+            self.last = buf
+            self.committed += 1
+            self.server.publish(buf)
+        else:
+            self.skipped += 1
+        if self.probe is not None:
+            self.probe.commit()
+        return written
+
+    def clear(self):
+        if self.local is not None:
+            self.local.clear()
+        self.last = bytes(NBYTES)
+        self.server.publish(self.last)
+
+    def invalidate(self):
+        self.last = None
+        if self.local is not None:
+            self.local.invalidate()
+
+    def close(self):
+        if self.local is not None:
+            self.local.close()
+
+    def stats(self):
+        return {"committed": self.committed, "skipped": self.skipped,
+                "server": self.server.stats()}
+
+class FrameClient:
+    """Receives frames and blits them to display (a DisplaySink)."""
+
+    def __init__(self, display, delay=0.0):
+        self.display = display
+        self.delay = delay          # seconds to sit on each frame (slow client)
+        self.buf = bytearray(NBYTES)
+        self.frames = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes = 0
+
+    async def run(self, address):
+        reader, writer = await open_connection(address)
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                kind = await reader.readexactly(1)
+                if kind == KEY:
+                    self.buf[:] = await reader.readexactly(NBYTES)
+                    self.keyframes += 1
+                    self.bytes += 1 + NBYTES
+                elif kind == DELTA:
+                    n = (await reader.readexactly(1))[0]
+                    body = await reader.readexactly(4 * n)
+                    apply_delta(self.buf, body)
+                    self.deltas += 1
+                    self.bytes += 2 + len(body)
+                else:
+                    raise ProtocolError("unknown message %r" % kind)
+                self.frames += 1
+                self.display.show(Frame(buf=bytes(self.buf)))
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(ACK)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # server went away
+        finally:
+            writer.close()
+
+    def stats(self):
+        return {"frames": self.frames, "keyframes": self.keyframes,
+                "deltas": self.deltas, "bytes": self.bytes}
+
+class CountingDisplay:
+    """Fake display for swarm clients: keeps the last frame and a count."""
+
+    def __init__(self):
+        self.frame = None
+        self.shown = 0
+
+    def show(self, frame):
+        self.frame = frame
+        self.shown += 1
+        return True
+
+async def swarm(address, n, seconds, slow=0, delay=0.05):
+    """Run n fake-display clients for seconds; the first slow ones lag by delay."""
+    clients = [FrameClient(CountingDisplay(), delay if i < slow else 0.0) for i in range(n)]
+    tasks = [asyncio.ensure_future(c.run(address)) for c in clients]
+    await asyncio.sleep(seconds)
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {"clients": n, "slow": slow,
+            "fast_frames": sum(c.frames for c in clients[slow:]),
+            "slow_frames": sum(c.frames for c in clients[:slow]),
+            "keyframes": sum(c.keyframes for c in clients),
+            "deltas": sum(c.deltas for c in clients),
+            "bytes": sum(c.bytes for c in clients)}
+
+def _sense(fake):
+    if fake:
+        import fakeSense
+        fakeSense.install()
+    try:
+        from sense_hat import SenseHat
+    except ImportError:
+        from sense_emu import SenseHat
+    return SenseHat()
+
+if __name__ == "__main__":
+    import argparse
+    from displaySink import open_display, add_display_args
+    from emojiPack import add_pack_args, open_from_args
+    import latency
+
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve", help="render an app and stream its frames")
+    p.add_argument("app", choices=("mood", "tilt"))
+    p.add_argument("--listen", required=True, metavar="ADDR")
+    p.add_argument("--no-local", action="store_true", help="do not draw on this board")
+    p.add_argument("--fake", action="store_true", help="use fakeSense instead of a board")
+    add_display_args(p)
+    add_pack_args(p)
+    latency.add_latency_args(p)
+    p = sub.add_parser("client", help="show a renderer's frames on this board")
+    p.add_argument("--connect", required=True, metavar="ADDR")
+    p.add_argument("--fake", action="store_true", help="use fakeSense instead of a board")
+    add_display_args(p)
+    p = sub.add_parser("swarm", help="N fake-display clients in one process")
+    p.add_argument("n", type=int)
+    p.add_argument("--connect", required=True, metavar="ADDR")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--slow", type=int, default=0, help="how many clients read slowly")
+    p.add_argument("--delay", type=float, default=0.05, help="seconds per frame for slow clients")
+    args = ap.parse_args()
+
+    if args.cmd == "serve":
+        latency.enable_from_args(args)
+        sense = _sense(args.fake)
+        server = FrameServer(args.listen).start()
+        local = None if args.no_local else open_display(sense, args.fb)
+        sink = StreamSink(server, local)
+        pack = open_from_args(args)
+        try:
+            if args.app == "mood":
+                from moodAnimator import MoodAnimator
+                MoodAnimator(sense=sense, display=sink, pack=pack).start()
+            else:
+                from tiltEmotions import TiltEmotions
+                TiltEmotions(sense=sense, display=sink, pack=pack).run()
+        finally:
+            server.close()
+            print(json.dumps(sink.stats(), indent=2))
+    elif args.cmd == "client":
+        client = FrameClient(open_display(_sense(args.fake), args.fb))
+        try:
+            asyncio.run(client.run(args.connect))
+        except KeyboardInterrupt:
+            pass
+    else:
+        t0 = time.monotonic()
+        result = asyncio.run(swarm(args.connect, args.n, args.seconds, args.slow, args.delay))
+        result["seconds"] = time.monotonic() - t0
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Windowed gesture recognizer for the Sense HAT IMU.
+
+Fed one sample at a time (timestamp, roll, optional angular rate), it detects
+- flip:       roll range within `window` seconds exceeds `flip_deg`
+- shake:      `shake_swings` roll reversals of at least `shake_deg` within
+              `shake_window` seconds
+- double_tap: two angular-rate spikes above `tap_rate` (rad/s, from
+              get_gyroscope_raw) no more than `tap_gap` seconds apart
+
+Each update is amortised O(1): the window min/max are kept in monotonic
+deques and only reversal/tap timestamps are stored. Every gesture is
+debounced and counted.
+"""
+
+from collections import deque
+
+GESTURES = ("flip", "shake", "double_tap")
+
+def signed_roll(roll):
+    return roll if roll <= 180 else roll - 360
+
+class GestureEngine:
+    def __init__(self, window=0.5, flip_deg=60.0,
+                 shake_window=1.0, shake_deg=25.0, shake_swings=4,
+                 tap_rate=4.0, tap_gap=0.4, debounce=0.6):
+        self.window = window
+        self.flip_deg = flip_deg
+        self.shake_window = shake_window
+        self.shake_deg = shake_deg
+        self.shake_swings = shake_swings
+        self.tap_rate = tap_rate
+        self.tap_gap = tap_gap
+        self.debounce = debounce
+        self.counts = dict.fromkeys(GESTURES, 0)
+        self.reset()
+
+    def reset(self):
+        self._roll = None         # unwrapped roll (no jump at +-180)
+        self._raw = None
+        self._hi = deque()        # (ts, roll), roll decreasing: window max at [0]
+        self._lo = deque()        # (ts, roll), roll increasing: window min at [0]
+        self._dir = 0             # current swing direction (+1/-1, 0 = none yet)
+        self._extreme = None      # furthest roll of the current swing
+        self._swings = deque()    # timestamps of reversals
+        self._tap_ts = None       # time of a first tap awaiting its second
+        self._in_spike = False
+        self._last = {}
+
+    def update(self, ts, roll, rate=None):
+        """Feed one sample; returns the list of gestures it completed."""
+        r = self._unwrap(roll)
+        fired = []
+        if self._flip(ts, r):
+            fired.append("flip")
+        if self._shake(ts, r):
+            fired.append("shake")
+        if rate is not None and self._double_tap(ts, rate):
+            fired.append("double_tap")
+        return fired
+
+    def _unwrap(self, roll):
+        raw = signed_roll(roll)
+        if self._roll is None:
+            self._roll = raw
+        else:
+            d = raw - self._raw
+            if d > 180:
+                d -= 360
+            elif d < -180:
+                d += 360
+            self._roll += d
+        self._raw = raw
+        return self._roll
+
+    def _fire(self, name, ts):
+        last = self._last.get(name)
+        if last is not None and ts - last < self.debounce:
+            return False
+        self._last[name] = ts
+        self.counts[name] += 1
+        return True
+
+    def _flip(self, ts, r):
+        hi, lo = self._hi, self._lo
+        while hi and hi[-1][1] <= r:
+            hi.pop()
+        hi.append((ts, r))
+        while lo and lo[-1][1] >= r:
+            lo.pop()
+        lo.append((ts, r))
+        start = ts - self.window
+        while hi[0][0] < start:
+            hi.popleft()
+        while lo[0][0] < start:
+            lo.popleft()
+        if hi[0][1] - lo[0][1] <= self.flip_deg:
+            return False
+        # start a fresh window so one flip is reported once
+        hi.clear(); lo.clear()
+        hi.append((ts, r)); lo.append((ts, r))
+        return self._fire("flip", ts)
+
+    def _shake(self, ts, r):
+        if self._extreme is None:
+            self._extreme = r
+            return False
+        d = r - self._extreme
+        if self._dir == 0:
+            if abs(d) >= self.shake_deg:
+                self._dir = 1 if d > 0 else -1
+                self._extreme = r
+            return False
+        if d * self._dir > 0:
+            self._extreme = r           # still moving the same way
+            return False
+        if abs(d) < self.shake_deg:
+            return False
+        self._dir = -self._dir
+        self._extreme = r
+        swings = self._swings
+        swings.append(ts)
+        while swings[0] < ts - self.shake_window:
+            swings.popleft()
+        if len(swings) < self.shake_swings:
+            return False
+        swings.clear()
+        return self._fire("shake", ts)
+
+    def _double_tap(self, ts, rate):
+        if self._in_spike:
+            if rate < self.tap_rate / 2:
+                self._in_spike = False
+            return False
+        if rate < self.tap_rate:
+            return False
+        self._in_spike = True
+        if self._tap_ts is not None and ts - self._tap_ts <= self.tap_gap:
+            self._tap_ts = None
+            return self._fire("double_tap", ts)
+        self._tap_ts = ts
+        return False
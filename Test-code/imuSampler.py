@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Fixed-rate IMU sampler.
+
+Reads sense.get_orientation_degrees() at a set rate on its own thread and
+keeps timestamped (ts, pitch, roll, yaw, rate) samples in a preallocated ring
+buffer, so consumers can read the latest sample or a recent window without
+touching the sensor or blocking on it. `rate` is the angular rate magnitude
+from get_gyroscope_raw() in rad/s when gyro sampling is on, else 0.0.
+"""
+
+from array import array
+
+from clocks import SYSTEM
+
+FIELDS = 5  # ts, pitch, roll, yaw, rate
+
+class ImuSampler:
+    RATE = 50      # samples per second
+    SIZE = 256     # samples kept in the ring
+
+    def __init__(self, sense, hz=RATE, size=SIZE, gyro=False, clock=SYSTEM):
+        self.sense = sense
+        self.clock = clock
+        self.gyro = gyro
+        self.period = 1.0 / hz
+        self.size = size
+        self.count = 0      # samples written so far (ring index = count % size)
+        self.overruns = 0   # periods skipped because a read ran late
+        self._ring = array("d", bytes(8 * FIELDS * size))
+        self._stop = clock.event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = self.clock.thread(self._run)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        clock = self.clock
+        next_t = clock.monotonic()
+        while not self._stop.is_set():
+            o = self.sense.get_orientation_degrees()
+            rate = 0.0
+            if self.gyro:
+                g = self.sense.get_gyroscope_raw()
+                rate = (g["x"]*g["x"] + g["y"]*g["y"] + g["z"]*g["z"]) ** 0.5
+            self.push(clock.monotonic(), o["pitch"], o["roll"], o["yaw"], rate)
+            next_t += self.period
+            delay = next_t - clock.monotonic()
+            if delay < 0:
+                # fell behind: drop the missed periods rather than bursting
+                self.overruns += 1
+                next_t = clock.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def push(self, ts, pitch, roll, yaw, rate=0.0):
+        i = (self.count % self.size) * FIELDS
+        r = self._ring
+        r[i] = ts; r[i+1] = pitch; r[i+2] = roll; r[i+3] = yaw; r[i+4] = rate
+        self.count += 1  # publish only once the slot is complete
+
+    def latest(self):
+        """Newest (ts, pitch, roll, yaw, rate), or None before the first sample."""
+        n = self.count
+        if n == 0:
+            return None
+        i = ((n - 1) % self.size) * FIELDS
+        return tuple(self._ring[i:i+FIELDS])
+
+    def since(self, seen):
+        """
+        (count, samples) where samples are the ones pushed after the first
+        `seen`, oldest first: a consumer passing back the count it got never
+        misses one, unless it falls a whole ring behind.
+        """
+        n = self.count
+        r = self._ring
+        out = []
+        # the slot of sample n - size is the one being overwritten next
+        for k in range(max(seen, n - self.size + 1), n):
+            i = (k % self.size) * FIELDS
+            out.append(tuple(r[i:i+FIELDS]))
+        return n, out
+
+    def window(self, seconds):
+        """Samples from the last `seconds`, oldest first."""
+        n = self.count
+        out = []
+        if n == 0:
+            return out
+        r = self._ring
+        newest = r[((n - 1) % self.size) * FIELDS]
+        for k in range(n - 1, max(-1, n - 1 - self.size), -1):
+            i = (k % self.size) * FIELDS
+            if newest - r[i] > seconds:
+                break
+            out.append(tuple(r[i:i+FIELDS]))
+        out.reverse()
+        return out
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Input-to-display latency instrumentation.
+
+Off by default: probe() returns None and the apps only pay an `if` on their
+hot paths. Once enabled (--latency FILE on any app), each app gets a Probe:
+
+    probe.input("up")           # joystick press, tilt zone change, flip, ...
+    answers = probe.take()      # the app handles the inputs marked so far
+    probe.arm(answers)          # ... and is about to show the frame they caused
+    probe.commit()              # called by the display sink on every frame
+
+so an input is closed by the frame it caused, not by whatever animation
+frame happens to be shown in between. Latencies go into
+constant-memory log-bucket histograms per app and event type, which are
+written as JSON to FILE on SIGUSR1 and at exit:
+
+    {"pad": {"up": {"count": .., "p50_ms": .., "p95_ms": .., "p99_ms": .., ...}}}
+"""
+
+import atexit
+import json
+import os
+import signal
+import threading
+import time
+from bisect import bisect_left
+
+# bucket upper bounds: 10 us growing by 25% up to ~60 s
+BOUNDS = []
+_b = 1e-5
+while _b < 60.0:
+    BOUNDS.append(_b)
+    _b *= 1.25
+BOUNDS.append(float("inf"))
+
+PENDING_MAX = 32  # inputs awaiting a commit, per app
+
+_probes = {}
+_stats_path = None
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (seconds)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BOUNDS[i], self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count,
+                "mean_ms": self.total / self.count * 1e3 if self.count else 0.0,
+                "p50_ms": self.percentile(50) * 1e3,
+                "p95_ms": self.percentile(95) * 1e3,
+                "p99_ms": self.percentile(99) * 1e3,
+                "max_ms": self.max * 1e3}
+
+class Probe:
+    """Latency recorder for one app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.pending = []
+        self.armed = []
+        self.hist = {}
+        self._lock = threading.Lock()
+
+    def input(self, event, ts=None):
+        """Mark an input; ts is a time.monotonic() value (default: now)."""
+        with self._lock:
+            if len(self.pending) >= PENDING_MAX:
+                self.pending.pop(0)
+            self.pending.append((event, time.monotonic() if ts is None else ts))
+
+    def take(self):
+        """The inputs marked so far, for the app to hand to the frame they cause."""
+        with self._lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+    def arm(self, inputs):
+        """Have the next commit close inputs (their frame is about to be shown)."""
+        if inputs:
+            with self._lock:
+                self.armed.extend(inputs)
+                del self.armed[:-PENDING_MAX]
+
+    def disarm(self):
+        """Armed inputs, handed over to a sink that commits them later."""
+        with self._lock:
+            armed, self.armed = self.armed, []
+        return armed
+
+    def close(self, inputs):
+        if not inputs:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for event, ts in inputs:
+                h = self.hist.get(event)
+                if h is None:
+                    h = self.hist[event] = Histogram()
+                h.add(now - ts)
+
+    def commit(self):
+        if self.armed:
+            self.close(self.disarm())
+
+    def summary(self):
+        with self._lock:
+            return {event: h.summary() for event, h in self.hist.items()}
+
+def enabled():
+    return _stats_path is not None
+
+def enable(stats_path):
+    """Turn instrumentation on; dump to stats_path on SIGUSR1 and at exit."""
+    global _stats_path
+    _stats_path = stats_path
+    atexit.register(dump)
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _dump_on_signal)
+
+def _dump_on_signal(signum, frame):
+    # the handler runs on the main thread, possibly while it holds a probe's
+    # lock (TiltEmotions.run() marks inputs there), so dump from a thread
+    threading.Thread(target=dump, name="latency-dump", daemon=True).start()
+
+def probe(app):
+    """Probe for app, or None while instrumentation is off."""
+    if _stats_path is None:
+        return None
+    p = _probes.get(app)
+    if p is None:
+        p = _probes[app] = Probe(app)
+    return p
+
+def snapshot():
+    return {app: p.summary() for app, p in _probes.items()}
+
+def dump(path=None):
+    path = path or _stats_path
+    if not path:
+        return
+    tmp = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+def add_latency_args(ap):
+    ap.add_argument("--latency", metavar="FILE",
+                    help="record input-to-display latency; JSON is written to "
+                         "FILE on SIGUSR1 and at exit")
+
+def enable_from_args(args):
+    if args.latency:
+        enable(args.latency)
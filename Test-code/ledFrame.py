@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compact 8x8 RGB frame shared by the Sense HAT apps.
+
+A frame is a single 192-byte buffer (64 pixels x r, g, b) instead of a list
+of 64 three-element lists, so building one costs one allocation and colour
+writes are slice assignments rather than list copies.
+"""
+
+import struct
+
+WIDTH = 8
+HEIGHT = 8
+NBYTES = WIDTH * HEIGHT * 3
+ROW = WIDTH * 3
+
+# Sense HAT framebuffer layout: 64 native-endian RGB565 words
+RGB565 = struct.Struct("=%dH" % (WIDTH * HEIGHT))
+
+def rgb565(r, g, b):
+    return ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+
+class Frame:
+    """8x8 pixel buffer backed by one bytearray (bytes once frozen)."""
+    __slots__ = ("buf",)
+
+    def __init__(self, color=None, buf=None):
+        if buf is not None:
+            self.buf = buf
+        elif color is None:
+            self.buf = bytearray(NBYTES)
+        else:
+            self.buf = bytearray(bytes(color) * (WIDTH * HEIGHT))
+
+    @classmethod
+    def from_pixels(cls, pixels):
+        """Build a frame from the set_pixels format (64 x [r, g, b])."""
+        return cls(buf=bytearray(v for c in pixels for v in c))
+
+    # ---- Drawing ----
+    def fill(self, color):
+        self.buf[:] = bytes(color) * (WIDTH * HEIGHT)
+
+    def put(self, x, y, color):
+        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+            i = (y*WIDTH + x) * 3
+            self.buf[i:i+3] = color
+
+    def get(self, x, y):
+        i = (y*WIDTH + x) * 3
+        return tuple(self.buf[i:i+3])
+
+    def border(self, color):
+        """Paint the outermost ring of pixels (the face vignette)."""
+        c = bytes(color)
+        self.buf[0:ROW] = c * WIDTH
+        self.buf[NBYTES-ROW:NBYTES] = c * WIDTH
+        for y in range(1, HEIGHT-1):
+            i = y * ROW
+            self.buf[i:i+3] = c
+            self.buf[i+ROW-3:i+ROW] = c
+
+    def blit(self, src, x0=0, y0=0, key=None):
+        """
+        Copy src onto this frame shifted by (x0, y0), clipped to 8x8.
+        Pixels of src equal to key are treated as transparent.
+        """
+        xs, xe = max(0, x0), min(WIDTH, WIDTH + x0)
+        if xs >= xe:
+            return
+        sv = memoryview(src.buf)
+        k = None if key is None else bytes(key)
+        for y in range(max(0, y0), min(HEIGHT, HEIGHT + y0)):
+            d = (y*WIDTH + xs) * 3
+            s = ((y - y0)*WIDTH + xs - x0) * 3
+            n = (xe - xs) * 3
+            if k is None:
+                self.buf[d:d+n] = sv[s:s+n]
+                continue
+            for j in range(0, n, 3):
+                if sv[s+j:s+j+3] != k:
+                    self.buf[d+j:d+j+3] = sv[s+j:s+j+3]
+
+    # ---- Conversion ----
+    def copy(self):
+        """Writable copy (also thaws a frozen frame)."""
+        return Frame(buf=bytearray(self.buf))
+
+    def freeze(self):
+        """Immutable copy; any later drawing on it raises TypeError."""
+        return Frame(buf=bytes(self.buf))
+
+    def to_pixels(self):
+        """Adapter to the sense.set_pixels format: 64 x [r, g, b]."""
+        b = self.buf
+        return [[b[i], b[i+1], b[i+2]] for i in range(0, NBYTES, 3)]
+
+    def rgb565_words(self):
+        b = self.buf
+        return [((b[i] >> 3) << 11) | ((b[i+1] >> 2) << 5) | (b[i+2] >> 3)
+                for i in range(0, NBYTES, 3)]
+
+    def to_rgb565(self):
+        """Pre-encode for the LED framebuffer (128 bytes)."""
+        return RGB565.pack(*self.rgb565_words())
+
+    def __eq__(self, other):
+        return isinstance(other, Frame) and self.buf == other.buf
+
+    __hash__ = None
@@ -1,8 +1,21 @@
 #!/usr/bin/env python3
 
 import time
+import asyncio
 import threading
-from collections import deque
+
+from ledFrame import Frame
+from compositor import compose, fill, dots, hline
+from emojiParts import (BLACK, DIM, EYE, MOUTH, BLUSH, TEAR, ANGRY, COOL, LOVE, WOW,
+                        face, mouth_line, EYES, WOW_EYES, SMILE, FROWN, BROWS, WOW_MOUTH)
+from displaySink import open_display, add_display_args
+from emojiPack import add_pack_args, open_from_args
+import latency
+import frameRecord
+import frameShare
+from frameScheduler import FrameScheduler
+from colorLut import fade, add_color_args, lut_from_args
+from clocks import SYSTEM
 
 # Sense HAT import (supports emulator fallback when developing off-device)
 try:
@@ -14,79 +27,17 @@ except ImportError:  # Optional emulator support if you test on a laptop
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
-# Basic colours (at least three per frame will be used)
-BLACK = [0, 0, 0]
-DIM = [5, 5, 5]
-FACE = [255, 200, 0]      # yellow face
-EYE = [0, 0, 0]           # black eyes
-MOUTH = [200, 0, 0]       # red mouth
-BLUSH = [255, 105, 97]    # coral
-TEAR = [64, 180, 255]     # blue tear
-ANGRY = [255, 50, 10]     # angry brow
-COOL = [120, 200, 255]    # cyan sunglasses
-LOVE = [255, 0, 100]      # pink heart
-WOW = [255, 255, 255]     # white highlight
-BKG = [10, 10, 20]        # subtle background
-
 def blank():
-    return [BLACK[:] for _ in range(64)]
-
-def put(px, x, y, color):
-    if 0 <= x < 8 and 0 <= y < 8:
-        px[y*8 + x] = color[:]
-
-def circle_face(base_color=FACE):
-    p = [base_color[:] for _ in range(64)]
-    # vignette border
-    for x in range(8):
-        for y in range(8):
-            if x in (0,7) or y in (0,7):
-                put(p, x, y, BKG)
-    return p
-
-def eyes(p, x1, x2, y=2, eye_color=EYE):
-    put(p, x1, y, eye_color)
-    put(p, x2, y, eye_color)
-
-def mouth_line(p, y, x1=2, x2=5, color=MOUTH):
-    for x in range(x1, x2+1):
-        put(p, x, y, color)
-
-def mouth_arc_smile(p, color=MOUTH):
-    put(p, 2, 5, color); put(p, 5, 5, color)
-    for x in range(3,5):
-        put(p, x, 6, color)
-
-def mouth_arc_sad(p, color=MOUTH):
-    put(p, 2, 6, color); put(p, 5, 6, color)
-    for x in range(3,5):
-        put(p, x, 5, color)
-
-def blush(p):
-    put(p, 1, 3, BLUSH); put(p, 6, 3, BLUSH)
-
-def tear(p):
-    put(p, 6, 3, TEAR); put(p, 6, 4, TEAR)
-
-def angry_brows(p):
-    put(p, 1, 1, ANGRY); put(p, 2, 1, ANGRY)
-    put(p, 5, 1, ANGRY); put(p, 6, 1, ANGRY)
-
-def sunglasses(p):
-    for x in range(1,3): put(p, x, 2, COOL)
-    for x in range(5,7): put(p, x, 2, COOL)
-    for x in range(2,5): put(p, x, 3, COOL)
-
-def heart_eyes(p):
-    # two small hearts as eyes
-    for (ox) in (1,5):
-        put(p, ox, 2, LOVE); put(p, ox+1, 2, LOVE)
-        put(p, ox, 3, LOVE); put(p, ox+1, 3, LOVE)
-        put(p, ox, 1, LOVE)
-
-def wow_mouth(p):
-    put(p, 3, 5, WOW); put(p, 4, 5, WOW)
-    put(p, 3, 6, WOW); put(p, 4, 6, WOW)
+    return Frame(BLACK)
+
+# Features as layers (compositor.py): frames are compose()d from stacks;
+# the palette and the features tiltEmotions shares are in emojiParts.py
+CHEEKS = dots(BLUSH, (1, 3), (6, 3))
+TEARDROP = dots(TEAR, (6, 3), (6, 4))
+SUNGLASSES = dots(COOL, (1, 2), (2, 2), (5, 2), (6, 2), (2, 3), (3, 3), (4, 3))
+# two small hearts as eyes
+HEART_EYES = dots(LOVE, *[(ox + dx, y) for ox in (1, 5) for dx, y in
+                          ((0, 2), (1, 2), (0, 3), (1, 3), (0, 1))])
 
 # Emoji classes
 class AnimatedEmoji:
@@ -94,246 +45,501 @@ class AnimatedEmoji:
     name = "Base"
 
     def frames(self):
-        """Return list[ list[RGB]*64 ] of frames."""
+        """Return list[Frame] of frames."""
         return []
 
     def fps(self):
         return 4  # default 4 FPS
 
+    def cache_key(self):
+        """Identify this animation in the frame cache (class + parameters)."""
+        return (type(self), tuple(sorted(vars(self).items())))
+
+# Frame cache
+class FrameCache:
+    """
+    Builds each emoji animation once and hands back the same frozen frames
+    on every later tick. Emojis whose frames really change must be
+    invalidated explicitly so the next lookup rebuilds them.
+    """
+
+    def __init__(self):
+        self._frames = {}
+        self._colored = {}   # (emoji key, ColorLut) -> frames through the LUT
+
+    def frames(self, emo, lut=None):
+        """The emoji's frames, passed through lut (colorLut.py) if given."""
+        key = emo.cache_key()
+        if lut is not None:
+            frames = self._colored.get((key, lut))
+            if frames is None:
+                frames = self._colored[(key, lut)] = lut.apply(self.frames(emo))
+            return frames
+        frames = self._frames.get(key)
+        if frames is None:
+            frames = tuple(f.freeze() for f in emo.frames()) or (blank().freeze(),)
+            self._frames[key] = frames
+        return frames
+
+    def invalidate(self, emo=None):
+        """Drop one emoji's frames, or everything when emo is None."""
+        if emo is None:
+            self._frames.clear()
+            self._colored.clear()
+        else:
+            key = emo.cache_key()
+            self._frames.pop(key, None)
+            for k in [k for k in self._colored if k[0] == key]:
+                del self._colored[k]
+
+frame_cache = FrameCache()
+
 
 class HappyEmoji(AnimatedEmoji):
     name = "Happy"
     def frames(self):
-        F = []
-        # Frame 1: smile + blush
-        p1 = circle_face()
-        eyes(p1, 2, 5); blush(p1); mouth_arc_smile(p1)
-        F.append(p1)
-        # Frame 2: wink left
-        p2 = circle_face()
-        put(p2, 2, 2, MOUTH)  # wink line
-        put(p2, 5, 2, EYE)
-        mouth_arc_smile(p2); blush(p2)
-        F.append(p2)
-        # Frame 3: big smile
-        p3 = circle_face()
-        eyes(p3, 2, 5); blush(p3)
-        for y in (5,6):
-            mouth_line(p3, y, 2, 5)
-        F.append(p3)
-        return F
+        return [
+            # Frame 1: smile + blush
+            compose(face() + [EYES, CHEEKS, SMILE]),
+            # Frame 2: wink left
+            compose(face() + [dots(MOUTH, (2, 2)), dots(EYE, (5, 2)), SMILE, CHEEKS]),
+            # Frame 3: big smile
+            compose(face() + [EYES, CHEEKS, mouth_line(5), mouth_line(6)]),
+        ]
 
 class SadEmoji(AnimatedEmoji):
     name = "Sad"
     def frames(self):
-        F=[]
-        # Frame 1: sad arc + tear start
-        p1 = circle_face()
-        eyes(p1, 2, 5); mouth_arc_sad(p1); tear(p1)
-        F.append(p1)
-        # Frame 2: tear lower
-        p2 = circle_face()
-        eyes(p2, 2, 5); mouth_arc_sad(p2)
-        put(p2, 6, 4, TEAR); put(p2, 6, 5, TEAR)
-        F.append(p2)
-        # Frame 3: double tear
-        p3 = circle_face()
-        eyes(p3, 2, 5); mouth_arc_sad(p3)
-        put(p3, 1, 4, TEAR); put(p3, 1, 5, TEAR)
-        put(p3, 6, 4, TEAR); put(p3, 6, 5, TEAR)
-        F.append(p3)
-        return F
+        return [
+            # Frame 1: sad arc + tear start
+            compose(face() + [EYES, FROWN, TEARDROP]),
+            # Frame 2: tear lower
+            compose(face() + [EYES, FROWN, dots(TEAR, (6, 4), (6, 5))]),
+            # Frame 3: double tear
+            compose(face() + [EYES, FROWN, dots(TEAR, (1, 4), (1, 5), (6, 4), (6, 5))]),
+        ]
 
 class AngryEmoji(AnimatedEmoji):
     name = "Angry"
     def frames(self):
-        F=[]
-        # Frame 1: brows down
-        p1 = circle_face()
-        angry_brows(p1); eyes(p1, 2, 5); mouth_line(p1, 6, 2, 5, MOUTH)
-        F.append(p1)
-        # Frame 2: mouth open
-        p2 = circle_face()
-        angry_brows(p2); eyes(p2, 2, 5); mouth_line(p2, 5, 2, 5, ANGRY)
-        F.append(p2)
-        # Frame 3: red flash
-        p3 = [ANGRY[:] for _ in range(64)]
-        F.append(p3)
-        return F
+        return [
+            # Frame 1: brows down
+            compose(face() + [BROWS, EYES, mouth_line(6, 2, 5, MOUTH)]),
+            # Frame 2: mouth open
+            compose(face() + [BROWS, EYES, mouth_line(5, 2, 5, ANGRY)]),
+            # Frame 3: red flash
+            compose([fill(ANGRY)]),
+        ]
     def fps(self): return 6
 
 class SurprisedEmoji(AnimatedEmoji):
     name = "Surprised"
     def frames(self):
-        F=[]
-        # Frame 1: wow eyes + round mouth
-        p1 = circle_face()
-        eyes(p1, 2, 2, 2, WOW); eyes(p1, 5, 5, 2, WOW)  # overwrite via helper misuse
-        wow_mouth(p1)
-        F.append(p1)
-        # Frame 2: blink
-        p2 = circle_face()
-        put(p2, 2, 2, WOW); put(p2, 5, 2, WOW)
-        put(p2, 3, 6, WOW); put(p2, 4, 6, WOW)
-        F.append(p2)
-        # Frame 3: glow
-        p3 = circle_face([255,230,120])
-        put(p3, 2, 2, WOW); put(p3, 5, 2, WOW)
-        wow_mouth(p3)
-        F.append(p3)
-        return F
+        return [
+            # Frame 1: wow eyes + round mouth
+            compose(face() + [WOW_EYES, WOW_MOUTH]),
+            # Frame 2: blink
+            compose(face() + [dots(WOW, (2, 2), (5, 2), (3, 6), (4, 6))]),
+            # Frame 3: glow
+            compose(face([255, 230, 120]) + [WOW_EYES, WOW_MOUTH]),
+        ]
 
 class CoolEmoji(AnimatedEmoji):
     name = "Cool"
     def frames(self):
-        F=[]
-        # Frame 1: sunglasses, smirk
-        p1 = circle_face()
-        sunglasses(p1); mouth_line(p1, 6, 3, 5, MOUTH)
-        F.append(p1)
-        # Frame 2: tilt shades
-        p2 = circle_face()
-        sunglasses(p2); put(p2, 1, 3, COOL)  # little motion
-        mouth_line(p2, 6, 2, 4, MOUTH)
-        F.append(p2)
-        # Frame 3: sparkle
-        p3 = circle_face()
-        sunglasses(p3); mouth_line(p3, 6, 3, 5, [255, 80, 80])
-        put(p3, 7, 0, WOW)
-        F.append(p3)
-        return F
+        return [
+            # Frame 1: sunglasses, smirk
+            compose(face() + [SUNGLASSES, mouth_line(6, 3, 5, MOUTH)]),
+            # Frame 2: tilt shades (little motion)
+            compose(face() + [SUNGLASSES, dots(COOL, (1, 3)), mouth_line(6, 2, 4, MOUTH)]),
+            # Frame 3: sparkle
+            compose(face() + [SUNGLASSES, mouth_line(6, 3, 5, [255, 80, 80]), dots(WOW, (7, 0))]),
+        ]
 
 class LoveEmoji(AnimatedEmoji):
     name = "Love"
     def frames(self):
-        F=[]
-        p1 = circle_face([255, 225, 150]); heart_eyes(p1); mouth_arc_smile(p1)
-        F.append(p1)
-        p2 = circle_face([255, 210, 130]); heart_eyes(p2); mouth_arc_smile(p2); put(p2, 0, 7, LOVE)
-        F.append(p2)
-        p3 = circle_face([255, 200, 120]); heart_eyes(p3); mouth_arc_smile(p3); put(p3, 7, 0, LOVE)
-        F.append(p3)
-        return F
+        return [
+            compose(face([255, 225, 150]) + [HEART_EYES, SMILE]),
+            compose(face([255, 210, 130]) + [HEART_EYES, SMILE, dots(LOVE, (0, 7))]),
+            compose(face([255, 200, 120]) + [HEART_EYES, SMILE, dots(LOVE, (7, 0))]),
+        ]
 
 class SleepFace(AnimatedEmoji):
     """Used for idle 'sleep mode'"""
     name = "Sleep"
     def frames(self):
-        F=[]
-        p = circle_face([180, 180, 190])
-        # closed eyes
-        put(p, 2, 2, DIM); put(p, 3, 2, DIM)
-        put(p, 4, 2, DIM); put(p, 5, 2, DIM)
-        mouth_line(p, 5, 3, 4, DIM)
-        # tiny 'Z' in corner
-        put(p, 6, 0, DIM); put(p, 7, 0, DIM); put(p, 6, 1, DIM); put(p, 7, 1, DIM)
-        F += [p, p]  # two frames to satisfy multi-frame API
-        return F
+        p = compose(face([180, 180, 190]) + [
+            hline(2, 2, 5, DIM),                             # closed eyes
+            mouth_line(5, 3, 4, DIM),
+            dots(DIM, (6, 0), (7, 0), (6, 1), (7, 1)),       # tiny 'Z' in corner
+        ])
+        return [p, p]  # two frames to satisfy multi-frame API
     def fps(self): return 2
 
+class PackedEmoji(AnimatedEmoji):
+    """An animation read from a compiled emoji pack (emojiPack.py)."""
+    def __init__(self, pack, pack_name):
+        self.pack = pack
+        self.pack_name = pack_name
+        self.name = pack_name.split(".", 1)[1]
+
+    def frames(self):
+        return list(self.pack.frames(self.pack_name))
+
+    def fps(self):
+        return self.pack.fps(self.pack_name)
+
 # Animator Controller
+class InputQueue:
+    """
+    Joystick presses waiting for the worker, coalesced as they arrive.
+
+    A press only moves the index (left/right, which also unpauses) or toggles
+    pause (middle), so any run of them reduces to the net step, whether a
+    move happened, and the parity of the toggles after the last move.
+    Applying that gives the same state as replaying the presses one by one,
+    in constant time and with one redraw (check_input_queue() tests exactly
+    that, `moodAnimator.py --check-input RUNS`). At most maxsize presses are
+    taken between two drains; the rest are dropped.
+    """
+    MAXSIZE = 64
+
+    def __init__(self, maxsize=MAXSIZE):
+        self.maxsize = maxsize
+        self.depth = 0        # presses since the last take()
+        self.steps = 0
+        self.moved = False
+        self.toggle = False
+        self.pushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.taken = 0        # presses handed out in batches
+        self.max_depth = 0
+
+    def __len__(self):
+        return self.depth
+
+    def push(self, direction):
+        """Queue one press; False if the queue was full and it was dropped."""
+        self.pushed += 1
+        if self.depth >= self.maxsize:
+            self.dropped += 1
+            return False
+        if direction == "middle":
+            self.toggle = not self.toggle
+        elif direction in ("left", "right"):
+            self.steps += 1 if direction == "right" else -1
+            self.moved = True
+            self.toggle = False
+        # any other direction only wakes the animator
+        self.depth += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+        return True
+
+    def take(self):
+        """(steps, moved, toggle) for every queued press and empty the queue; None if empty."""
+        if not self.depth:
+            return None
+        batch = (self.steps, self.moved, self.toggle)
+        self.batches += 1
+        self.taken += self.depth
+        self.depth = self.steps = 0
+        self.moved = self.toggle = False
+        return batch
+
+    def stats(self):
+        return {"pushed": self.pushed, "dropped": self.dropped, "batches": self.batches,
+                "depth": self.depth, "max_depth": self.max_depth,
+                "coalescing": self.taken / self.batches if self.batches else 0.0}
+
 class MoodAnimator:
     IDLE_TIMEOUT = 20.0  # seconds
-
-    def __init__(self):
-        self.sense = SenseHat()
-        self.sense.clear()
+    SLEEP_BRIGHTNESS = 0.3
+    FADE_STEPS = 6
+    FADE_STEP = 0.05     # seconds per step of the fade to sleep
+    INPUT_PERIOD = 0.025 # presses closer together than this are coalesced
+
+    def __init__(self, fb=None, sense=None, display=None, pack=None, lut=None, clock=None):
+        self.clock = clock or SYSTEM   # clocks.VirtualClock to simulate
+        self.sense = sense or SenseHat()
+        self.display = display or open_display(self.sense, fb)
+        self.display.clear()
         self.sense.low_light = False
+        self.latency = latency.probe("mood")
+        self.display.probe = self.latency
 
         self.emojis = [
             HappyEmoji(), SadEmoji(), AngryEmoji(),
             SurprisedEmoji(), CoolEmoji(), LoveEmoji()
         ]
+        self.sleep_face = SleepFace()
+        if pack is not None and pack.names("mood."):
+            # every mood animation in the pack, in build order
+            names = pack.names("mood.")
+            self.emojis = [PackedEmoji(pack, n) for n in names if n != "mood.Sleep"]
+            if "mood.Sleep" in pack:
+                self.sleep_face = PackedEmoji(pack, "mood.Sleep")
+        self.cache = frame_cache
+        self.lut = lut       # colour calibration for every frame, or None
+        # dimming is done in software (see sleep()), so low_light stays off
+        self.sleep_fade = fade(self.FADE_STEPS, 1.0, self.SLEEP_BRIGHTNESS, lut)
         self.index = 0
+        self.timing = FrameScheduler(self._fps(), self.clock.monotonic)
         self.paused = False
         self.sleeping = False
-        self.last_input_ts = time.monotonic()
+        self.last_input_ts = self.clock.monotonic()
 
-        # event queue for joystick
-        self.events = deque()
-        self._register_joystick()
+        # coalesced joystick presses; the condition guards it and wakes the
+        # worker on input
+        self.input = InputQueue()
+        self._input_due = 0.0   # earliest time the next batch is handled
+        self._wakeup = self.clock.condition()
 
         # worker thread
         self._stop = False
-        self.worker = threading.Thread(target=self._run_loop, daemon=True)
+        self.worker = self.clock.thread(self._run_loop)
 
     def _register_joystick(self):
         def on_event(event):
             if event.action != ACTION_PRESSED:
                 return
-            self.events.append(event.direction)
-            self.last_input_ts = time.monotonic()
+            with self._wakeup:
+                if self.latency: self.latency.input(event.direction)
+                self.input.push(event.direction)
+                self.last_input_ts = self.clock.monotonic()
+                self._wakeup.notify()
 
         self.sense.stick.direction_left = on_event
         self.sense.stick.direction_right = on_event
         self.sense.stick.direction_middle = on_event
 
     def start(self):
+        self._register_joystick()
         self.worker.start()
         try:
-            while self.worker.is_alive():
-                time.sleep(0.1)
+            self.worker.join()
         except KeyboardInterrupt:
             pass
         finally:
             self.shutdown()
 
     def shutdown(self):
-        self._stop = True
-        self.sense.clear()
+        with self._wakeup:
+            self._stop = True
+            self._wakeup.notify()
+        if self.worker.is_alive() and self.worker is not threading.current_thread():
+            self.worker.join()
+        self.display.clear()
 
     def _handle_events(self):
-        woke = False
-        while self.events:
-            d = self.events.popleft()
-            if self.sleeping:
-                self.wake()
-                woke = True
-                # continue to consume but first wake; next events can act
-            if d == "left":
-                self.index = (self.index - 1) % len(self.emojis)
-                self.paused = False
-            elif d == "right":
-                self.index = (self.index + 1) % len(self.emojis)
-                self.paused = False
-            elif d == "middle":
-                self.paused = not self.paused
+        with self._wakeup:
+            batch = self.input.take()
+            answers = self.latency.take() if self.latency else None
+        if batch is None:
+            return False
+        steps, moved, toggle = batch
+        self._input_due = self.clock.monotonic() + self.INPUT_PERIOD
+        woke = self.sleeping
+        if woke:
+            self.wake()  # the presses that woke us still act
+        if moved:
+            self.index = (self.index + steps) % len(self.emojis)
+            self.paused = False
+        if toggle:
+            self.paused = not self.paused
+        if answers:
+            if self.paused:
+                self.latency.close(answers)  # pausing keeps the frame already shown
+            else:
+                self.latency.arm(answers)    # closed by the next frame shown
         return woke
 
-    def sleep_if_idle(self):
+    def sleep_if_idle(self, blocking=True):
         if self.sleeping:
             return
-        if (time.monotonic() - self.last_input_ts) >= self.IDLE_TIMEOUT:
-            self.sleep()
+        if (self.clock.monotonic() - self.last_input_ts) >= self.IDLE_TIMEOUT:
+            self.sleep(blocking)
+
+    def sleep_frames(self):
+        """The sleep face fading from full to sleep brightness."""
+        return [self.cache.frames(self.sleep_face, lut)[-1] for lut in self.sleep_fade]
 
-    def sleep(self):
+    def sleep(self, blocking=True):
+        """Fade to the sleep face; with blocking=False the caller plays sleep_frames()."""
         self.sleeping = True
-        self.sense.low_light = True
-        for frame in SleepFace().frames():
-            self.sense.set_pixels(frame)
+        if not blocking:
+            return
+        for i, frame in enumerate(self.sleep_frames()):
+            if i:
+                self.clock.sleep(self.FADE_STEP)
+            self.display.show(frame)
         # keep last sleep frame displayed
 
     def wake(self):
         self.sleeping = False
-        self.sense.low_light = False
+
+    def _wait_for_work(self, next_frame):
+        """
+        Block until the next frame is due, the idle timeout expires or
+        joystick input is ready, whichever comes first. Paused waits only for
+        input or idle; sleeping waits only for input. Input is ready at once
+        after a quiet spell, otherwise INPUT_PERIOD after the last batch, so
+        a burst of presses is handled (and redrawn) as one.
+        """
+        with self._wakeup:
+            while not self._stop:
+                deadlines = []
+                if self.input:
+                    deadlines.append(self._input_due)
+                if not self.sleeping:
+                    deadlines.append(self.last_input_ts + self.IDLE_TIMEOUT)
+                    if not self.paused:
+                        deadlines.append(next_frame)
+                if not deadlines:
+                    self._wakeup.wait()
+                    continue
+                timeout = min(deadlines) - self.clock.monotonic()
+                if timeout <= 0:
+                    return
+                self._wakeup.wait(timeout)
+
+    def _fps(self):
+        return clamp(self.emojis[self.index].fps(), 1, 12)
 
     def _run_loop(self):
-        frame_i = 0
-        while not self._stop:
-            self._handle_events()
+        # frames are paced from absolute deadlines (frameScheduler.py); the
+        # animation carries on from frame_i across runs
+        timing = self.timing
+        frame_i = base = 0
+        while True:
+            self._wait_for_work(timing.deadline)
+            if self._stop:
+                return
+            if self.input and self.clock.monotonic() >= self._input_due:
+                self._handle_events()
+                timing.reset(fps=self._fps())  # show the result right away
+                base = frame_i
             self.sleep_if_idle()
 
-            if not self.sleeping and not self.paused:
-                emo = self.emojis[self.index]
-                frames = emo.frames()
-                if not frames:
-                    frames = [blank()]
-                frame = frames[frame_i % len(frames)]
-                self.sense.set_pixels(frame)
+            if not self.sleeping and not self.paused and timing.remaining() <= 0:
+                frames = self.cache.frames(self.emojis[self.index], self.lut)
+                frame_i = base + timing.tick()
+                self.display.show(frames[frame_i % len(frames)])
                 frame_i += 1
-                time.sleep(1.0 / clamp(emo.fps(), 1, 12))
-            else:
-                time.sleep(0.05)
+
+    async def run_async(self, rt):
+        """
+        Coroutine version of start() for the shared asyncio runtime
+        (senseRuntime.py): the emoji plays as a cancellable animation task
+        that is restarted whenever input changes what should be shown.
+        """
+        events = rt.joystick(self.display)
+        anim = None
+        try:
+            while True:
+                if anim is None and not self.sleeping and not self.paused:
+                    emo = self.emojis[self.index]
+                    anim = rt.animate(self.display, self.cache.frames(emo, self.lut),
+                                      clamp(emo.fps(), 1, 12))
+                state = (self.index, self.paused, self.sleeping)
+                idle = self.last_input_ts + self.IDLE_TIMEOUT - time.monotonic()
+                e = await events.get(timeout=None if self.sleeping else max(0.0, idle))
+                if e is not None and self._input_due > time.monotonic():
+                    # coalesce with whatever else arrives until then
+                    await asyncio.sleep(self._input_due - time.monotonic())
+                pressed = [p for p in ([e] if e is not None else []) + events.drain()
+                           if p.action == ACTION_PRESSED]
+                if pressed:
+                    for p in pressed:
+                        if self.latency: self.latency.input(p.direction)
+                        self.input.push(p.direction)
+                    self.last_input_ts = time.monotonic()
+                    self._handle_events()
+                self.sleep_if_idle(blocking=False)
+                if anim is not None and (self.index, self.paused, self.sleeping) != state:
+                    anim.cancel()
+                    anim = None
+                if self.sleeping and not state[2]:
+                    anim = rt.animate(self.display, self.sleep_frames(),
+                                      1.0 / self.FADE_STEP, repeat=False)
+        finally:
+            if anim is not None:
+                anim.cancel()
+
+def press_by_press(index, paused, sleeping, presses, n):
+    """
+    (index, paused, sleeping) after presses, handled one at a time as the
+    animator did before InputQueue: the first press wakes it and still acts.
+    """
+    for d in presses:
+        sleeping = False
+        if d in ("left", "right"):
+            index = (index + (1 if d == "right" else -1)) % n
+            paused = False
+        elif d == "middle":
+            paused = not paused
+    return index, paused, sleeping
+
+class _Batch:
+    """MoodAnimator's input handling without a board, display or worker."""
+    _handle_events = MoodAnimator._handle_events
+    wake = MoodAnimator.wake
+    INPUT_PERIOD = MoodAnimator.INPUT_PERIOD
+    clock = SYSTEM
+    latency = None
+
+    def __init__(self, n, index, paused, sleeping, maxsize):
+        self.emojis = [None] * n
+        self.index, self.paused, self.sleeping = index, paused, sleeping
+        self.input = InputQueue(maxsize)
+        self._wakeup = threading.Lock()
+
+def check_input_queue(runs=10000, seed=None, maxsize=InputQueue.MAXSIZE):
+    """
+    Feed random press runs (some longer than maxsize) through InputQueue and
+    MoodAnimator._handle_events and compare with press_by_press() on the
+    presses the queue kept; returns the runs that differ.
+    """
+    import random
+    rnd = random.Random(seed)
+    failures = []
+    for _ in range(runs):
+        n = rnd.randint(1, 8)
+        start = (rnd.randrange(n), rnd.random() < 0.5, rnd.random() < 0.3)
+        presses = [rnd.choice(("left", "right", "middle", "up", "down"))
+                   for _ in range(rnd.choice((rnd.randint(1, 6), rnd.randint(1, 2 * maxsize))))]
+        app = _Batch(n, *start, maxsize)
+        for d in presses:
+            app.input.push(d)
+        app._handle_events()
+        got = (app.index, app.paused, app.sleeping)
+        want = press_by_press(*start, presses[:maxsize], n)
+        if got != want:
+            failures.append((start, n, presses, got, want))
+    return failures
 
 if __name__ == "__main__":
-    MoodAnimator().start()
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--check-input", type=int, metavar="RUNS",
+                    help="check InputQueue against press-by-press handling and exit")
+    add_display_args(ap)
+    latency.add_latency_args(ap)
+    add_pack_args(ap)
+    frameRecord.add_record_args(ap)
+    frameShare.add_renderer_args(ap)
+    add_color_args(ap)
+    args = ap.parse_args()
+    if args.check_input:
+        failures = check_input_queue(args.check_input)
+        for f in failures[:10]:
+            print("start %s of %d, presses %s: got %s, want %s" % f)
+        print("%d runs, %d differ" % (args.check_input, len(failures)))
+        raise SystemExit(1 if failures else 0)
+    latency.enable_from_args(args)
+    app = MoodAnimator(fb=args.fb, display=frameShare.open_from_args(args),
+                       pack=open_from_args(args), lut=lut_from_args(args))
+    app.display.recorder = frameRecord.open_from_args(args)
+    app.start()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Headless replay of NumberPad joystick logs.
+
+Runs recorded events through the pad's operations (calculator.OPS) with no
+hardware, no sleeps and, unless asked for, no rendering. A log is one event
+per line, `#` starts a comment:
+
+    <timestamp> <up|down|left|right|middle> [pressed|released|held]
+
+Only pressed events act, as on the device. With a sink (anything with
+show(frame), e.g. a DisplaySink) every resulting value frame is rendered
+and shown. Expectations, one line per event, are checked after each event:
+either the text format_value should produce ("16", "OF") or the value
+frame's 384 hex digits.
+
+Usage:
+    python3 padReplay.py LOG [--expect FILE] [--x0 X]
+    python3 padReplay.py --generate N [--seed S]    # random log on stdout
+"""
+
+import json
+import random
+import time
+
+try:
+    import calculator
+except ImportError:
+    # no sense_hat/sense_emu here; the replay never touches the device anyway
+    import fakeSense
+    fakeSense.install()
+    import calculator
+
+from calculator import DEFAULT, OPS, format_value, value_frame
+
+DIRECTIONS = ("up", "down", "left", "right", "middle")
+MISMATCHES_KEPT = 20
+
+def read_log(path):
+    """Yield (timestamp, direction) for every pressed event in the log."""
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].split()
+            if not line:
+                continue
+            if len(line) > 2 and line[2] != "pressed":
+                continue
+            yield float(line[0]), line[1]
+
+def random_events(n, seed=None, rate=20.0):
+    rnd = random.Random(seed)
+    t = 0.0
+    for _ in range(n):
+        t += rnd.expovariate(rate)
+        yield t, rnd.choice(DIRECTIONS)
+
+def read_expected(path):
+    """One expectation per line: display text (str) or a frame (bytes)."""
+    out = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            out.append(bytes.fromhex(line) if len(line) == 384 else line)
+    return out
+
+class ReplayResult:
+    def __init__(self):
+        self.events = 0
+        self.ignored = 0
+        self.ops = dict.fromkeys(DIRECTIONS, 0)
+        self.flashes = {}          # flash message -> count ("OF", "ERR", "+", ...)
+        self.x = DEFAULT
+        self.checked = 0
+        self.mismatches = []       # (event index, timestamp, x, shown text)
+        self.mismatch_count = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {"events": self.events, "ignored": self.ignored, "ops": self.ops,
+                "flashes": self.flashes, "final_x": self.x,
+                "checked": self.checked, "mismatch_count": self.mismatch_count,
+                "mismatches": self.mismatches, "seconds": self.seconds,
+                "events_per_second": self.events / self.seconds if self.seconds else 0.0}
+
+def replay(events, x=DEFAULT, sink=None, expected=None):
+    """Apply events to x; render only if a sink or expected frames are given."""
+    res = ReplayResult()
+    ops = OPS
+    counts = res.ops
+    flashes = res.flashes
+    t0 = time.perf_counter()
+    if sink is None and expected is None:
+        for _, d in events:
+            op = ops.get(d)
+            if op is None:
+                res.ignored += 1
+                continue
+            x, msg, _ = op(x)
+            counts[d] += 1
+            flashes[msg] = flashes.get(msg, 0) + 1
+    else:
+        for i, (ts, d) in enumerate(events):
+            op = ops.get(d)
+            if op is None:
+                res.ignored += 1
+                continue
+            x, msg, _ = op(x)
+            counts[d] += 1
+            flashes[msg] = flashes.get(msg, 0) + 1
+            frame = None
+            if sink is not None:
+                frame = value_frame(x)
+                sink.show(frame)
+            if expected is not None and i < len(expected):
+                want = expected[i]
+                res.checked += 1
+                if isinstance(want, str):
+                    ok = format_value(x) == want
+                else:
+                    ok = (frame or value_frame(x)).buf == want
+                if not ok:
+                    res.mismatch_count += 1
+                    if len(res.mismatches) < MISMATCHES_KEPT:
+                        res.mismatches.append((i, ts, x, format_value(x)))
+    res.seconds = time.perf_counter() - t0
+    res.events = sum(counts.values()) + res.ignored
+    res.x = x
+    return res
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("log", nargs="?", help="joystick event log")
+    ap.add_argument("--expect", help="expected frame per event")
+    ap.add_argument("--x0", type=float, default=DEFAULT, help="starting value")
+    ap.add_argument("--generate", type=int, metavar="N", help="print a random log of N events")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+    if args.generate:
+        for ts, d in random_events(args.generate, args.seed):
+            print("%.4f %s" % (ts, d))
+    elif args.log:
+        events = list(read_log(args.log))
+        expected = read_expected(args.expect) if args.expect else None
+        print(json.dumps(replay(events, args.x0, expected=expected).as_dict(), indent=2))
+    else:
+        ap.error("a log or --generate is required")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Shared asyncio runtime for the Sense HAT apps.
+
+One process, one SenseHat, one display writer. NumberPad, TiltEmotions and
+MoodAnimator each expose a run_async(rt) coroutine that can run alone or
+alongside the others:
+
+- joystick(display): async stream of stick events for the app owning display
+- orientation():     latest IMU samples from one periodic sampler task
+- animate(...):      cancellable task that plays frames on an app's display
+- channel():         per-app display; only the focused app reaches the LEDs
+
+Holding the joystick middle button moves focus (display and stick) to the
+next app.
+
+Usage:
+    python3 senseRuntime.py pad mood tilt [--fb [DEVICE]]
+"""
+
+import asyncio
+import threading
+
+from ledFrame import Frame
+from displaySink import open_display, add_display_args
+from latency import add_latency_args, enable_from_args, PENDING_MAX
+from emojiPack import add_pack_args, open_from_args
+import frameRecord
+from frameScheduler import FrameScheduler
+from colorLut import add_color_args, lut_from_args
+
+try:
+    from sense_hat import SenseHat, ACTION_PRESSED, ACTION_HELD, ACTION_RELEASED
+except ImportError:
+    from sense_emu import SenseHat, ACTION_PRESSED, ACTION_HELD, ACTION_RELEASED
+
+class EventStream:
+    """Bounded async queue; when full, the oldest item is dropped."""
+
+    def __init__(self, maxsize=64):
+        self._q = asyncio.Queue(maxsize)
+
+    def put(self, item):
+        if self._q.full():
+            self._q.get_nowait()
+        self._q.put_nowait(item)
+
+    def drain(self):
+        """Every item already queued, without waiting."""
+        items = []
+        while not self._q.empty():
+            items.append(self._q.get_nowait())
+        return items
+
+    async def get(self, timeout=None):
+        """Next item, or None if timeout (seconds) passes first."""
+        if timeout is None:
+            return await self._q.get()
+        try:
+            return await asyncio.wait_for(self._q.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._q.get()
+
+class AppChannel:
+    """
+    Stands in for an app's DisplaySink. Frames are only recorded here and
+    written by the runtime's display writer while this app has focus; show()
+    may be called from any thread.
+    """
+
+    def __init__(self, rt):
+        self.rt = rt
+        self.frame = None
+        self.answers = []  # inputs armed on probe, closed when the writer commits
+        self.probe = None  # latency.Probe
+        self._lock = threading.Lock()
+
+    def show(self, frame):
+        with self._lock:
+            self.frame = frame
+            if self.probe is not None and self.probe.armed:
+                self.answers.extend(self.probe.disarm())
+                del self.answers[:-PENDING_MAX]   # piles up while out of focus
+        self.rt._kick()
+        return True
+
+    def take(self):
+        """(frame, inputs it answers) for the writer."""
+        with self._lock:
+            answers, self.answers = self.answers, []
+            return self.frame, answers
+
+    def clear(self):
+        self.show(Frame())
+
+    def invalidate(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return self.rt.sink.stats()
+
+class SenseRuntime:
+    IMU_PERIOD = 0.05  # seconds between orientation samples
+
+    def __init__(self, fb=None):
+        self.sense = SenseHat()
+        self.sink = open_display(self.sense, fb)
+        self.sink.clear()
+        self.channels = []
+        self.focus = 0
+        self._streams = {}       # channel -> joystick EventStream
+        self._imu_subs = []
+        self._sampler = None
+        self._held = False
+        self._middle = None      # middle press held back until its release
+        self._loop = None
+        self._dirty = None
+
+    # ---- Apps ----
+    def channel(self):
+        ch = AppChannel(self)
+        self.channels.append(ch)
+        return ch
+
+    def joystick(self, display):
+        """Stick events for the app drawing on display (while it has focus)."""
+        stream = self._streams.get(display)
+        if stream is None:
+            stream = self._streams[display] = EventStream()
+        return stream
+
+    def orientation(self):
+        """Stream of get_orientation_degrees() dicts; only the newest is kept."""
+        stream = EventStream(maxsize=1)
+        self._imu_subs.append(stream)
+        if self._sampler is None:
+            self._sampler = asyncio.ensure_future(self._sample_imu())
+        return stream
+
+    def animate(self, display, frames, fps, repeat=True):
+        """Play frames on display as a task; cancel the task to stop it."""
+        async def play():
+            # paced from absolute deadlines, skipping frames when behind
+            timing = FrameScheduler(fps)
+            last = None if repeat else len(frames) - 1
+            while frames:
+                k = timing.tick(last=last)
+                display.show(frames[k % len(frames)])
+                await asyncio.sleep(max(0.0, timing.remaining()))
+                if k == last:
+                    return
+        return asyncio.ensure_future(play())
+
+    def set_focus(self, i):
+        self.focus = i % len(self.channels)
+        self._kick()
+
+    # ---- Tasks ----
+    async def _sample_imu(self):
+        while True:
+            o = self.sense.get_orientation_degrees()
+            for s in self._imu_subs:
+                s.put(o)
+            await asyncio.sleep(self.IMU_PERIOD)
+
+    async def _write_display(self):
+        """The only task that writes to the LED matrix."""
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            if self.channels:
+                ch = self.channels[self.focus]
+                frame, answers = ch.take()
+                if frame is not None:
+                    self.sink.show(frame)
+                    if answers:
+                        ch.probe.close(answers)
+
+    def _kick(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dirty.set)
+
+    def _on_stick(self, event):
+        # called from the stick's thread
+        self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event):
+        if event.direction == "middle" and len(self.channels) > 1:
+            # the stick reports "pressed" before "held": keep the press until
+            # the release shows it wasn't the start of a focus switch
+            if event.action == ACTION_PRESSED:
+                self._middle = event
+                return
+            if event.action == ACTION_HELD:
+                if not self._held:
+                    self._held = True
+                    self._middle = None
+                    self.set_focus(self.focus + 1)
+                return
+            if event.action == ACTION_RELEASED:
+                pressed, self._middle = self._middle, None
+                if self._held:
+                    self._held = False
+                    return
+                if pressed is not None:
+                    self._deliver(pressed)
+        elif event.action == ACTION_RELEASED:
+            self._held = False
+        self._deliver(event)
+
+    def _deliver(self, event):
+        if self.channels:
+            stream = self._streams.get(self.channels[self.focus])
+            if stream is not None:
+                stream.put(event)
+
+    async def main(self, apps):
+        self._loop = asyncio.get_running_loop()
+        self._dirty = asyncio.Event()
+        self._dirty.set()
+        self.sense.stick.direction_any = self._on_stick
+        writer = asyncio.ensure_future(self._write_display())
+        try:
+            await asyncio.gather(*(app.run_async(self) for app in apps))
+        finally:
+            self.sense.stick.direction_any = None
+            self._loop = None
+            writer.cancel()
+            if self._sampler is not None:
+                self._sampler.cancel()
+
+    def run(self, apps):
+        try:
+            asyncio.run(self.main(apps))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.sink.clear()
+
+def make_app(kind, rt, pack=None, lut=None):
+    if kind == "pad":
+        from calculator import NumberPad
+        return NumberPad(sense=rt.sense, display=rt.channel())
+    if kind == "mood":
+        from moodAnimator import MoodAnimator
+        return MoodAnimator(sense=rt.sense, display=rt.channel(), pack=pack, lut=lut)
+    if kind == "tilt":
+        from tiltEmotions import TiltEmotions
+        return TiltEmotions(sense=rt.sense, display=rt.channel(), pack=pack, lut=lut)
+    raise ValueError("unknown app: %s" % kind)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("apps", nargs="+", choices=("pad", "mood", "tilt"))
+    add_display_args(ap)
+    add_latency_args(ap)
+    add_pack_args(ap)
+    frameRecord.add_record_args(ap)
+    add_color_args(ap)
+    args = ap.parse_args()
+    enable_from_args(args)
+    pack = open_from_args(args)
+    lut = lut_from_args(args)
+    rt = SenseRuntime(fb=args.fb)
+    rt.sink.recorder = frameRecord.open_from_args(args)
+    rt.run([make_app(kind, rt, pack, lut) for kind in args.apps])
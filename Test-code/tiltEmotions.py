@@ -1,95 +1,205 @@
 #!/usr/bin/env python3
 
-import time
+import asyncio
 from math import fabs
 try:
     from sense_hat import SenseHat, ACTION_PRESSED
 except ImportError:
     from sense_emu import SenseHat, ACTION_PRESSED
 
-# Reuse simple colour palette
-BLACK = [0,0,0]; FACE=[255,200,0]; EYE=[0,0,0]
-MOUTH=[200,0,0]; TEAR=[64,180,255]; ANGRY=[255,50,10]
-COOL=[120,200,255]; WOW=[255,255,255]; LOVE=[255,0,100]
-BKG=[10,10,20]
+from compositor import compose, fill, dots
+from emojiParts import (EYE, TEAR, ANGRY, COOL, LOVE, face,
+                        EYES, WOW_EYES, SMILE, FROWN, BROWS, WOW_MOUTH)
+from displaySink import open_display, add_display_args
+from imuSampler import ImuSampler
+from gestures import GestureEngine, signed_roll
+from frameScheduler import FrameScheduler
+from colorLut import add_color_args, lut_from_args
+from emojiPack import add_pack_args, open_from_args
+import latency
+import frameRecord
+import frameShare
+from clocks import SYSTEM
 
-def put(px,x,y,c):
-    if 0<=x<8 and 0<=y<8: px[y*8+x]=c[:]
+# Features as layers (compositor.py); shared ones are in emojiParts.py
+SUNGLASSES = dots(COOL, (1,2), (2,2), (5,2), (6,2), (2,3), (3,3), (4,3), (5,3))
+HEARTS = dots(LOVE, (1,2), (2,2), (1,3), (2,3), (5,2), (6,2), (5,3), (6,3))
 
-def face_base(col=FACE):
-    p=[col[:] for _ in range(64)]
-    for x in range(8):
-        for y in range(8):
-            if x in (0,7) or y in (0,7): put(p,x,y,BKG)
-    return p
+KINDS = ("forward", "back", "left", "right", "flat", "special")
 
-def eyes(p):
-    put(p,2,2,EYE); put(p,5,2,EYE)
-
-def smile(p):
-    put(p,2,5,MOUTH); put(p,5,5,MOUTH); put(p,3,6,MOUTH); put(p,4,6,MOUTH)
-
-def sad(p):
-    put(p,2,6,MOUTH); put(p,5,6,MOUTH); put(p,3,5,MOUTH); put(p,4,5,MOUTH)
-
-def wow(p):
-    put(p,3,5,WOW); put(p,4,5,WOW); put(p,3,6,WOW); put(p,4,6,WOW)
-
-def angry(p):
-    put(p,1,1,ANGRY); put(p,2,1,ANGRY); put(p,5,1,ANGRY); put(p,6,1,ANGRY)
-
-def sunglasses(p):
-    for x in range(1,3): put(p,x,2,COOL)
-    for x in range(5,7): put(p,x,2,COOL)
-    for x in range(2,6): put(p,x,3,COOL)
-
-def heart(p):
-    for (ox) in (1,5):
-        put(p,ox,2,LOVE); put(p,ox+1,2,LOVE); put(p,ox,3,LOVE); put(p,ox+1,3,LOVE)
+def kind_fps(kind):
+    return 6 if kind == "special" else 5
 
 def build_frames(kind):
     # five baseline moods + special:
     # forward=Happy, back=Sad, left=Angry, right=Cool, flat=Surprised, special=Love fireworks
     frames=[]
     if kind=="forward":   # Happy (subtle bounce)
-        p1=face_base(); eyes(p1); smile(p1)
-        p2=face_base(); put(p2,2,1,EYE); put(p2,5,1,EYE); smile(p2)
+        p1=compose(face() + [EYES, SMILE])
+        p2=compose(face() + [dots(EYE,(2,1),(5,1)), SMILE])
         frames=[p1,p2,p1]
     elif kind=="back":    # Sad (teardrop)
-        p1=face_base(); eyes(p1); sad(p1); put(p1,6,4,TEAR)
-        p2=face_base(); eyes(p2); sad(p2); put(p2,6,5,TEAR)
-        p3=face_base(); eyes(p3); sad(p3)
+        p1=compose(face() + [EYES, FROWN, dots(TEAR,(6,4))])
+        p2=compose(face() + [EYES, FROWN, dots(TEAR,(6,5))])
+        p3=compose(face() + [EYES, FROWN])
         frames=[p1,p2,p3]
     elif kind=="left":    # Angry (flash)
-        p1=face_base(); angry(p1); eyes(p1)
-        p2=[ANGRY[:] for _ in range(64)]
-        p3=face_base(); angry(p3); eyes(p3)
+        p1=compose(face() + [BROWS, EYES])
+        p2=compose([fill(ANGRY)])
+        p3=compose(face() + [BROWS, EYES])
         frames=[p1,p2,p3]
     elif kind=="right":   # Cool (tilt glasses)
-        p1=face_base(); sunglasses(p1)
-        p2=face_base(); sunglasses(p2); put(p2,1,4,COOL)
+        p1=compose(face() + [SUNGLASSES])
+        p2=compose(face() + [SUNGLASSES, dots(COOL,(1,4))])
         frames=[p1,p2,p1]
     elif kind=="flat":    # Surprised
-        p1=face_base([255,230,120]); put(p1,2,2,WOW); put(p1,5,2,WOW); wow(p1)
-        p2=face_base([255,220,110]); put(p2,2,2,WOW); put(p2,5,2,WOW)
+        p1=compose(face([255,230,120]) + [WOW_EYES, WOW_MOUTH])
+        p2=compose(face([255,220,110]) + [WOW_EYES])
         frames=[p1,p2,p1]
     elif kind=="special": # Love fireworks
-        p1=face_base([255,225,150]); heart(p1); smile(p1)
-        p2=face_base([255,210,140]); heart(p2); put(p2,0,0,LOVE); put(p2,7,7,LOVE)
-        p3=face_base([255,200,130]); heart(p3); put(p3,7,0,LOVE); put(p3,0,7,LOVE)
+        p1=compose(face([255,225,150]) + [HEARTS, SMILE])
+        p2=compose(face([255,210,140]) + [HEARTS, dots(LOVE,(0,0),(7,7))])
+        p3=compose(face([255,200,130]) + [HEARTS, dots(LOVE,(7,0),(0,7))])
         frames=[p1,p2,p3,p2]
     return frames
 
+class AnimationPlayer:
+    """
+    Plays a frame sequence on a background thread. play() returns at once and
+    pre-empts whatever is playing, so the caller can keep sampling the IMU.
+    Reaction latency is measured from a play() request to its first frame
+    reaching the display; the inputs passed to play() are armed on probe
+    (latency.py) for that same frame.
+    """
+
+    def __init__(self, display, clock=SYSTEM, probe=None):
+        self.display = display
+        self.clock = clock
+        self.probe = probe
+        self._cond = clock.condition()
+        self._pending = None     # (frames, fps, requested_at, answers)
+        self._gen = 0            # bumped on every play()/stop() to pre-empt
+        self._closed = False
+        self._thread = None
+        self.played = 0
+        self.preempted = 0
+        self.timing = FrameScheduler(5, clock.monotonic)   # pacing stats across all sequences
+        self.last_latency = 0.0
+        self.worst_latency = 0.0
+
+    def play(self, frames, fps, answers=()):
+        with self._cond:
+            if self._thread is None:
+                self._thread = self.clock.thread(self._run)
+                self._thread.start()
+            if self._pending is not None:
+                # the sequence it replaces never showed: its inputs come along
+                answers = list(self._pending[3]) + list(answers)
+            self._pending = (frames, fps, self.clock.monotonic(), answers)
+            self._gen += 1
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._pending = None
+            self._gen += 1
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {"played": self.played, "preempted": self.preempted,
+                "last_latency": self.last_latency, "worst_latency": self.worst_latency,
+                "timing": self.timing.stats()}
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while self._pending is None and not self._closed:
+                    cond.wait()
+                if self._closed:
+                    return
+                frames, fps, requested_at, answers = self._pending
+                self._pending = None
+                gen = self._gen
+            self.played += 1
+            timing = self.timing
+            with cond:
+                timing.reset(fps=fps)
+                last = len(frames) - 1
+                k = -1
+                first = True
+                while k < last:
+                    if gen != self._gen or self._closed:
+                        self.preempted += 1
+                        if first and self._pending is not None:
+                            f, r, t, later = self._pending
+                            self._pending = (f, r, t, list(answers) + list(later))
+                        break
+                    # overdue frames are skipped, the last one always shows
+                    k = timing.tick(last=last)
+                    if first and answers and self.probe is not None:
+                        self.probe.arm(answers)
+                    # shown under the lock: a pre-empted frame never lands late
+                    self.display.show(frames[k])
+                    if first:
+                        first = False
+                        self.last_latency = self.clock.monotonic() - requested_at
+                        self.worst_latency = max(self.worst_latency, self.last_latency)
+                    while gen == self._gen and not self._closed:
+                        remaining = timing.remaining()
+                        if remaining <= 0:
+                            break
+                        cond.wait(remaining)
+
 class TiltEmotions:
-    def __init__(self):
-        self.sense = SenseHat()
-        self.sense.clear()
+    DEADBAND = 15.0   # |pitch| and |roll| below this are flat
+    TILT = 20.0       # pitch or roll beyond this selects a tilted zone
+
+    def __init__(self, fb=None, sense=None, display=None, imu_hz=ImuSampler.RATE,
+                 gyro=False, gestures=None, pack=None, lut=None, imu_log=None, clock=None):
+        self.clock = clock or SYSTEM   # clocks.VirtualClock to simulate
+        self.sense = sense or SenseHat()
+        self.display = display or open_display(self.sense, fb)
+        self.display.clear()
+        self.latency = latency.probe("tilt")
+        self.display.probe = self.latency
+        self.imu = ImuSampler(self.sense, imu_hz, gyro=gyro, clock=self.clock)
+        self.player = AnimationPlayer(self.display, self.clock, self.latency)
+        self.gestures = gestures or GestureEngine()
+        self.pack = pack
+        self.lut = lut            # colour calibration (colorLut.py), or None
+        self._frames = {}         # kind -> (frames, fps), LUT already applied
+        self.imu_log = imu_log    # file getting every sample run() sees (tiltReplay.py)
         self.paused = False
         self.zone = None
-        self.last_roll = None
-        self.last_roll_ts = None
+        self._stop = False
 
-        self.sense.stick.direction_middle = self._on_joy
+    def stop(self):
+        """Make run() return after the sample it is handling."""
+        self._stop = True
+
+    def frames_for(self, kind):
+        """The kind's frames and fps, from the emoji pack when one is loaded."""
+        cached = self._frames.get(kind)
+        if cached is not None:
+            return cached
+        name = "tilt." + kind
+        if self.pack is not None and name in self.pack:
+            frames, fps = self.pack.frames(name), self.pack.fps(name)
+        else:
+            frames, fps = tuple(f.freeze() for f in build_frames(kind)), kind_fps(kind)
+        if self.lut is not None:
+            frames = self.lut.apply(frames)
+        self._frames[kind] = (frames, fps)
+        return frames, fps
 
     def _on_joy(self, event):
         if event.action == ACTION_PRESSED:
@@ -105,57 +215,138 @@ class TiltEmotions:
 
     def _zone_from_angles(self, pitch, roll):
         # deadband ±15 for flat; threshold 20deg for tilts
-        if abs(pitch) < 15 and abs((roll if roll<=180 else roll-360)) < 15:
+        if abs(pitch) < self.DEADBAND and abs(signed_roll(roll)) < self.DEADBAND:
             return "flat"
-        if pitch > 20:
+        if pitch > self.TILT:
             return "forward"
-        if pitch < -20:
+        if pitch < -self.TILT:
             return "back"
         # Convert roll to signed
-        r = roll if roll <= 180 else roll - 360
-        if r > 20:
+        r = signed_roll(roll)
+        if r > self.TILT:
             return "right"
-        if r < -20:
+        if r < -self.TILT:
             return "left"
         return "flat"
 
-    def _rapid_flip(self, roll):
-        now = time.monotonic()
-        r = roll if roll <= 180 else roll - 360
-        if self.last_roll is None:
-            self.last_roll, self.last_roll_ts = r, now
-            return False
-        dt = now - self.last_roll_ts
-        dr = abs(r - self.last_roll)
-        self.last_roll, self.last_roll_ts = r, now
-        return (dr > 60.0) and (dt <= 0.5)
+    def _rapid_flip(self, roll, now=None, rate=None):
+        # >60deg of roll within 0.5 s, over however many samples it spans;
+        # shakes and double taps are counted by the same engine
+        if now is None:
+            now = self.clock.monotonic()
+        return "flip" in self.gestures.update(now, roll, rate)
 
     def show_sequence(self, frames, fps=6):
-        for f in frames:
-            self.sense.set_pixels(f)
-            time.sleep(1.0 / fps)
+        timing = self.player.timing
+        timing.reset(fps=fps)
+        last = len(frames) - 1
+        k = -1
+        while k < last:
+            k = timing.tick(last=last)
+            self.display.show(frames[k])
+            self.clock.sleep(max(0.0, timing.remaining()))
+
+    def _mark(self, event, ts=None):
+        """Mark an input for the latency probe; the inputs the next frame answers."""
+        if not self.latency:
+            return ()
+        self.latency.input(event, ts)
+        return self.latency.take()
+
+    def _handle_sample(self, ts, pitch, roll, yaw, rate):
+        if self.imu_log is not None:
+            self.imu_log.write("%r %r %r %r %r\n" % (ts, pitch, roll, yaw, rate))
+        # animations play in the background and are pre-empted by the next
+        # flip or zone change
+        if self._rapid_flip(roll, ts, rate if self.imu.gyro else None):
+            if not self.paused:
+                self.player.play(*self.frames_for("special"), answers=self._mark("flip", ts))
+            return
+
+        z = self._zone_from_angles(pitch, roll)
+        if z != self.zone:
+            self.zone = z
+            if not self.paused:
+                self.player.play(*self.frames_for(z), answers=self._mark("zone", ts))
 
     def run(self):
+        self.sense.stick.direction_middle = self._on_joy
+        self.imu.start()
+        seen = 0
         try:
-            while True:
-                pitch, roll, yaw = self._read_orientation()
-                if self._rapid_flip(roll):
-                    if not self.paused:
-                        self.show_sequence(build_frames("special"))
+            while not self._stop:
+                # wait for new IMU samples; the sampler sets the pace
+                if self.imu.count == seen:
+                    self.clock.sleep(self.imu.period)
                     continue
-
-                z = self._zone_from_angles(pitch, roll)
-                if z != self.zone:
-                    self.zone = z
-                    if not self.paused:
-                        self.show_sequence(build_frames(z), fps=5)
-                else:
-                    # keep screen steady to avoid flicker
-                    time.sleep(0.05)
+                # every sample since the last pass, so one-sample gyro spikes
+                # (double taps) and fast flips are never skipped
+                seen, samples = self.imu.since(seen)
+                for ts, pitch, roll, yaw, rate in samples:
+                    self._handle_sample(ts, pitch, roll, yaw, rate)
         except KeyboardInterrupt:
             pass
         finally:
-            self.sense.clear()
+            self.player.close()
+            self.imu.stop()
+            self.display.clear()
+
+    async def _pause_on_press(self, events):
+        async for e in events:
+            if e.direction == "middle":
+                self._on_joy(e)
+
+    async def run_async(self, rt):
+        """
+        Coroutine version of run() for the shared asyncio runtime
+        (senseRuntime.py). Orientation keeps being sampled while an animation
+        plays, and a new zone or flip cancels the animation in progress.
+        """
+        buttons = asyncio.ensure_future(self._pause_on_press(rt.joystick(self.display)))
+        anim = None
+        try:
+            async for o in rt.orientation():
+                if self._rapid_flip(o["roll"]):
+                    kind = "special"
+                else:
+                    z = self._zone_from_angles(o["pitch"], o["roll"])
+                    if z == self.zone:
+                        continue
+                    self.zone = z
+                    kind = z
+                if not self.paused:
+                    answers = self._mark("flip" if kind == "special" else "zone")
+                    if anim is not None:
+                        anim.cancel()
+                    if answers:
+                        self.latency.arm(answers)  # the new animation's first frame
+                    frames, fps = self.frames_for(kind)
+                    anim = rt.animate(self.display, frames, fps, repeat=False)
+        finally:
+            buttons.cancel()
+            if anim is not None:
+                anim.cancel()
 
 if __name__ == "__main__":
-    TiltEmotions().run()
+    import argparse
+    ap = argparse.ArgumentParser()
+    add_display_args(ap)
+    latency.add_latency_args(ap)
+    add_pack_args(ap)
+    ap.add_argument("--imu-hz", type=float, default=ImuSampler.RATE,
+                    help="IMU sampling rate (default: %(default)s)")
+    ap.add_argument("--gyro", action="store_true",
+                    help="also sample the gyroscope (enables double-tap detection)")
+    ap.add_argument("--imu-log", type=argparse.FileType("w"), metavar="FILE",
+                    help="log every IMU sample for offline replay (tiltReplay.py)")
+    frameRecord.add_record_args(ap)
+    frameShare.add_renderer_args(ap)
+    add_color_args(ap)
+    args = ap.parse_args()
+    latency.enable_from_args(args)
+    app = TiltEmotions(fb=args.fb, display=frameShare.open_from_args(args),
+                       imu_hz=args.imu_hz, gyro=args.gyro,
+                       pack=open_from_args(args), lut=lut_from_args(args),
+                       imu_log=args.imu_log)
+    app.display.recorder = frameRecord.open_from_args(args)
+    app.run()
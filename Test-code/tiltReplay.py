@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Offline replay of IMU traces through TiltEmotions' zone and flip logic.
+
+A trace is one sample per line, `#` starts a comment, as written by
+`tiltEmotions.py --imu-log FILE`:
+
+    <timestamp> <pitch> <roll> <yaw> [rate]
+
+replay() returns the events the live loop would have produced, in order:
+("flip", ts) when _rapid_flip fires (that sample is then not classified,
+as in run()) and ("zone", ts, zone) whenever the zone changes.
+
+With NumPy a whole trace is classified at once: zones with a handful of
+masked comparisons, flips from a sliding window range of the unwrapped roll
+(one vectorized pass per sample of window length), after which only the
+few candidate samples are walked to apply the engine's window restart and
+debounce. Without NumPy (or with exact=True) every sample goes through the
+real TiltEmotions._zone_from_angles/_rapid_flip and GestureEngine, which is
+also how the fast path is checked: check() replays seeded random traces
+both ways and reports the seeds whose events differ.
+
+Usage:
+    python3 tiltReplay.py TRACE... [--deadband 12,15,18] [--tilt 20,25]
+                          [--flip-deg 60] [--events] [--exact]
+    python3 tiltReplay.py --generate SECONDS [--seed S]    # random trace
+    python3 tiltReplay.py --check N [--generate SECONDS]   # fast path == exact
+"""
+
+import json
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import tiltEmotions
+except ImportError:
+    # no sense_hat/sense_emu here; the replay never touches the device anyway
+    import fakeSense
+    fakeSense.install()
+    import tiltEmotions
+
+from gestures import GestureEngine
+
+TiltEmotions = tiltEmotions.TiltEmotions
+ZONES = ("flat", "forward", "back", "left", "right")
+
+def read_trace(path):
+    """Columns ts, pitch, roll (lists, or arrays with NumPy) of a trace file."""
+    ts, pitch, roll = [], [], []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].split()
+            if len(line) < 3:
+                continue
+            ts.append(float(line[0]))
+            pitch.append(float(line[1]))
+            roll.append(float(line[2]))
+    if np is not None:
+        return np.array(ts), np.array(pitch), np.array(roll)
+    return ts, pitch, roll
+
+def random_trace(seconds, seed=None, hz=50.0):
+    """Synthetic session: holds, slow tilts, wobble and the odd fast flip."""
+    rnd = random.Random(seed)
+    t, pitch, roll = 0.0, 0.0, 0.0
+    target = (0.0, 0.0)
+    flip = 0.0
+    while t < seconds:
+        if rnd.random() < 0.01:
+            target = (rnd.choice((0, 0, 30, -30, 45, -45)), rnd.choice((0, 0, 30, -30, 50, -50)))
+        if rnd.random() < 0.002:
+            flip = rnd.choice((-1, 1)) * 360.0
+        pitch += (target[0] - pitch) * 0.05 + rnd.gauss(0, 1.0)
+        step = flip * 0.25
+        flip -= step
+        roll += (target[1] - roll) * 0.05 + rnd.gauss(0, 1.0)
+        yield t, pitch, (roll + step) % 360, 0.0
+        roll = (roll + step + 180) % 360 - 180
+        t += 1.0 / hz
+
+class _Offline:
+    """TiltEmotions' classification methods without a board, display or IMU."""
+    _zone_from_angles = TiltEmotions._zone_from_angles
+    _rapid_flip = TiltEmotions._rapid_flip
+
+    def __init__(self, deadband, tilt, gestures):
+        self.DEADBAND = deadband
+        self.TILT = tilt
+        self.gestures = gestures
+
+def _replay_exact(ts, pitch, roll, deadband, tilt, engine):
+    app = _Offline(deadband, tilt, engine)
+    events = []
+    zone = None
+    for t, p, r in zip(ts, pitch, roll):
+        t, p, r = float(t), float(p), float(r)
+        if app._rapid_flip(r, t):
+            events.append(("flip", t))
+            continue
+        z = app._zone_from_angles(p, r)
+        if z != zone:
+            zone = z
+            events.append(("zone", t, z))
+    return events
+
+def classify(pitch, roll, deadband=TiltEmotions.DEADBAND, tilt=TiltEmotions.TILT):
+    """Zone index (into ZONES) of every sample; _zone_from_angles, vectorized."""
+    r = np.where(roll <= 180, roll, roll - 360)
+    flat = (np.abs(pitch) < deadband) & (np.abs(r) < deadband)
+    return np.select([flat, pitch > tilt, pitch < -tilt, r > tilt, r < -tilt],
+                     [0, 1, 2, 4, 3], default=0)
+
+def unwrap_roll(roll):
+    """GestureEngine's unwrapped roll, summed in the same order."""
+    raw = np.where(roll <= 180, roll, roll - 360)
+    d = np.diff(raw)
+    d = np.where(d > 180, d - 360, np.where(d < -180, d + 360, d))
+    return np.cumsum(np.concatenate((raw[:1], d)))
+
+def flips(ts, roll, engine):
+    """Timestamps at which engine would report a flip, for the whole trace."""
+    n = len(ts)
+    if n == 0:
+        return []
+    r = unwrap_roll(roll)
+    first = np.searchsorted(ts, ts - engine.window, side="left")  # window start
+    idx = np.arange(n)
+    hi = r.copy()
+    lo = r.copy()
+    for k in range(1, int((idx - first).max()) + 1):
+        ok = idx - k >= first
+        prev = np.roll(r, k)
+        hi = np.where(ok & (prev > hi), prev, hi)
+        lo = np.where(ok & (prev < lo), prev, lo)
+    # a detection restarts the engine's window at that sample, so later
+    # candidates inside it are rechecked over the shortened window
+    cand = np.flatnonzero(hi - lo > engine.flip_deg)
+    rl, tl, fl = r.tolist(), ts.tolist(), first[cand].tolist()
+    fired = []
+    restart = -1
+    last = None
+    for i, f in zip(cand.tolist(), fl):
+        if restart > f:
+            w = rl[restart:i+1]
+            if max(w) - min(w) <= engine.flip_deg:
+                continue
+        restart = i
+        t = tl[i]
+        if last is None or t - last >= engine.debounce:
+            last = t
+            fired.append(i)
+    return fired
+
+def replay(ts, pitch, roll, deadband=TiltEmotions.DEADBAND, tilt=TiltEmotions.TILT,
+           engine=None, exact=False):
+    """Events the live loop would emit for a trace (see the module docstring)."""
+    engine = engine or GestureEngine()
+    if np is None or exact:
+        return _replay_exact(ts, pitch, roll, deadband, tilt, engine)
+    ts, pitch, roll = np.asarray(ts, float), np.asarray(pitch, float), np.asarray(roll, float)
+    flipped = flips(ts, roll, engine)
+    keep = np.ones(len(ts), dtype=bool)
+    keep[flipped] = False
+    zones = classify(pitch, roll, deadband, tilt)
+    kept = np.flatnonzero(keep)
+    z = zones[kept]
+    change = np.ones(len(z), dtype=bool)
+    change[1:] = z[1:] != z[:-1]
+    events = [(int(i), ("flip", float(ts[i]))) for i in flipped]
+    events += [(int(i), ("zone", float(ts[i]), ZONES[zones[i]])) for i in kept[change]]
+    events.sort(key=lambda e: e[0])
+    return [e for _, e in events]
+
+CHECK_RATES = (25.0, 50.0, 100.0, 200.0)   # sample rates check() cycles through
+
+def check(seeds, seconds=60.0, deadband=TiltEmotions.DEADBAND, tilt=TiltEmotions.TILT,
+          flip_deg=60.0, window=0.5):
+    """
+    Replay random_trace(seconds, seed) for every seed on the fast path and
+    through the live code (exact=True); returns (samples, seeds whose
+    events differ).
+    """
+    samples = 0
+    mismatches = []
+    for seed in seeds:
+        hz = CHECK_RATES[seed % len(CHECK_RATES)]
+        trace = list(random_trace(seconds, seed, hz))
+        ts, pitch, roll = ([s[i] for s in trace] for i in range(3))
+        fast = replay(ts, pitch, roll, deadband, tilt,
+                      GestureEngine(window=window, flip_deg=flip_deg))
+        exact = replay(ts, pitch, roll, deadband, tilt,
+                       GestureEngine(window=window, flip_deg=flip_deg), exact=True)
+        samples += len(trace)
+        if fast != exact:
+            mismatches.append(seed)
+    return samples, mismatches
+
+def summarize(events):
+    out = {"flips": 0, "zone_changes": 0, "zones": dict.fromkeys(ZONES, 0)}
+    for e in events:
+        if e[0] == "flip":
+            out["flips"] += 1
+        else:
+            out["zone_changes"] += 1
+            out["zones"][e[2]] += 1
+    return out
+
+def _floats(s):
+    return [float(v) for v in s.split(",")]
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("traces", nargs="*", help="IMU trace files")
+    ap.add_argument("--deadband", type=_floats, default=[TiltEmotions.DEADBAND],
+                    help="flat deadband(s) in degrees, comma-separated")
+    ap.add_argument("--tilt", type=_floats, default=[TiltEmotions.TILT],
+                    help="tilt threshold(s) in degrees, comma-separated")
+    ap.add_argument("--flip-deg", type=float, default=60.0)
+    ap.add_argument("--window", type=float, default=0.5, help="flip window (s)")
+    ap.add_argument("--events", action="store_true", help="print every event")
+    ap.add_argument("--exact", action="store_true",
+                    help="run each sample through the live code instead of NumPy")
+    ap.add_argument("--generate", type=float, metavar="SECONDS",
+                    help="print a random trace of this length")
+    ap.add_argument("--seed", type=int)
+    ap.add_argument("--check", type=int, metavar="N",
+                    help="compare the NumPy path with the live code on N seeded "
+                         "random traces (--generate sets their length, default 60 s)")
+    args = ap.parse_args()
+    if args.check:
+        if np is None:
+            ap.error("--check compares against the NumPy path, which needs NumPy")
+        first = args.seed or 0
+        seeds = range(first, first + args.check)
+        results = []
+        bad = 0
+        t0 = time.perf_counter()
+        samples = 0
+        for deadband in args.deadband:
+            for tilt in args.tilt:
+                n, mismatches = check(seeds, args.generate or 60.0, deadband, tilt,
+                                      args.flip_deg, args.window)
+                samples += n
+                bad += len(mismatches)
+                results.append({"deadband": deadband, "tilt": tilt, "mismatches": mismatches})
+        print(json.dumps({"traces": len(seeds), "samples": samples,
+                          "seconds": time.perf_counter() - t0, "results": results}, indent=2))
+        sys.exit(1 if bad else 0)
+    elif args.generate:
+        for t, p, r, y in random_trace(args.generate, args.seed):
+            print("%r %r %r %r" % (t, p, r, y))
+    elif args.traces:
+        traces = [read_trace(p) for p in args.traces]
+        results = []
+        t0 = time.perf_counter()
+        samples = 0
+        for deadband in args.deadband:
+            for tilt in args.tilt:
+                total = {"deadband": deadband, "tilt": tilt, "flips": 0, "zone_changes": 0,
+                         "zones": dict.fromkeys(ZONES, 0)}
+                for path, (ts, pitch, roll) in zip(args.traces, traces):
+                    engine = GestureEngine(window=args.window, flip_deg=args.flip_deg)
+                    events = replay(ts, pitch, roll, deadband, tilt, engine, args.exact)
+                    samples += len(ts)
+                    if args.events:
+                        for e in events:
+                            print(path, *e)
+                    s = summarize(events)
+                    total["flips"] += s["flips"]
+                    total["zone_changes"] += s["zone_changes"]
+                    for z in ZONES:
+                        total["zones"][z] += s["zones"][z]
+                results.append(total)
+        seconds = time.perf_counter() - t0
+        print(json.dumps({"traces": len(traces), "samples": samples, "seconds": seconds,
+                          "samples_per_second": samples / seconds if seconds else 0.0,
+                          "results": results}, indent=2))
+    else:
+        ap.error("trace files or --generate are required")